@@ -0,0 +1,66 @@
+import numpy as np
+
+# Parameters of the instances of every preset. The scaling curves vary
+# one parameter at a time from the base instance.
+PRESETS = {
+    'small': {'base': {'rows': 2, 'cols': 4, 'magnitude': 2, 'upper_bound': 2},
+              'scaling': {'rows': [1, 2, 3, 4],
+                          'cols': [2, 4, 8, 16],
+                          'magnitude': [1, 2, 4, 8]}},
+    'medium': {'base': {'rows': 4, 'cols': 8, 'magnitude': 2, 'upper_bound': 3},
+               'scaling': {'rows': [2, 4, 8, 16],
+                           'cols': [4, 8, 16, 32, 64],
+                           'magnitude': [1, 2, 8, 32, 128]}},
+    'large': {'base': {'rows': 8, 'cols': 32, 'magnitude': 4, 'upper_bound': 3},
+              'scaling': {'rows': [4, 8, 16, 32, 64],
+                          'cols': [16, 32, 64, 128, 256],
+                          'magnitude': [2, 16, 256, 4096]}},
+}
+
+#######################################################
+def random_instance(rows, cols, magnitude, upper_bound, density=1.0, seed=0):
+    """
+    Returns a random polytope {y>=0 : Ay=b} in standard form together
+    with one of its integer points.
+
+    Input
+        - rows, cols: shape of the matrix A
+        - magnitude: largest absolute value of the entries of A
+        - upper_bound: upper bound of the entries of the integer point
+    Optional input
+        - density: probability that an entry of A is nonzero
+        - seed: seed of the random generator
+    Output
+        - M: Array (A|b)
+        - y: integer point of the polytope with entries at most
+          upper_bound
+    """
+    rng = np.random.default_rng(seed)
+    A = rng.integers(-magnitude, magnitude + 1, size=(rows, cols))
+    A[rng.random((rows, cols)) >= density] = 0
+
+    # Every column gets a nonzero entry so that the entries of the
+    # points are bounded by the plane sums
+    zero_cols = np.flatnonzero(~A.any(axis=0))
+    A[rng.integers(0, rows, size=len(zero_cols)), zero_cols] = magnitude
+
+    y = rng.integers(0, upper_bound + 1, size=cols)
+    M = np.column_stack((A, A @ y))
+
+    return(M, y)
+#######################################################
+
+
+#######################################################
+def scaling_instances(preset, seed=0):
+    """
+    Generates the tuples (parameters, M, y) of the scaling curves of the
+    preset, see PRESETS
+    """
+    base = PRESETS[preset]['base']
+    for name, values in PRESETS[preset]['scaling'].items():
+        for value in values:
+            parameters = dict(base, **{name: value})
+            M, y = random_instance(seed=seed, **parameters)
+            yield(dict(parameters, curve=name), M, y)
+#######################################################
@@ -0,0 +1,176 @@
+"""
+Benchmarks of the stages of the representation of a polytope as a slim
+line-sum transportation polytope, over scaling curves of random
+instances (see instances.py). Every stage is timed with time.perf_counter
+and its peak memory is measured with tracemalloc in a separate run. The
+results are written to a JSON file, and a previous file can be passed
+with --compare to print the ratio of the median times.
+
+    python benchmarks/run_benchmarks.py --preset small --output small.json
+    python benchmarks/run_benchmarks.py --preset small --compare small.json
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+import numpy as np
+import scipy
+
+# Adding the path to the parent directory of trans_polytope_repr
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from trans_polytope_repr import *
+from trans_polytope_repr.embedding import _stage_one
+from trans_polytope_repr.slim_line_sum import _slim_line_sum_size, _slim_line_sum_itemsizes
+from instances import PRESETS, scaling_instances
+
+#######################################################
+def measure(function, repeat):
+    """
+    Returns the output of function and a dictionary with the times of
+    repeat calls and the peak memory of one more call
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return(result, {'times': times,
+                    'min': min(times),
+                    'median': statistics.median(times),
+                    'peak_bytes': peak})
+#######################################################
+
+
+#######################################################
+def benchmark_instance(M, y, U, args):
+    """
+    Returns a dictionary with the measurements of every stage on the
+    polytope {y>=0 : Ay=b} with upper bound U
+    """
+    results = {}
+    def run(stage, function):
+        result, results[stage] = measure(function, args.repeat)
+        return(result)
+
+    # Stage 1
+    run('prep_rep', lambda: prep_rep(M))
+    M_updated, expansion = _stage_one(M)
+    y_updated = y if expansion is None else np.rint(expansion @ y).astype(np.int64)
+
+    # Stage 2
+    P = run('as_plane_sum', lambda: as_plane_sum(M_updated, U))
+    size = _slim_line_sum_size(len(P.u), len(P.v), len(P.w), len(P.cells), 
+                               _slim_line_sum_itemsizes(P))
+    r, c, dense_bytes = size['r'], size['c'], size['dense_bytes']
+    results['dimensions'] = {'prep_rows': int(M_updated.shape[0]), 'sum_r': len(P.u),
+                             'enabled': int(len(P.Enabled)), 'r': r, 'c': c,
+                             'dense_bytes': dense_bytes}
+
+    # Stage 3
+    S_sparse = run('as_slim_line_sum_sparse', lambda: as_slim_line_sum(P, sparse=True))
+    dense = max(dense_bytes, args.batch*8*r*c*3) <= args.max_dense_bytes
+    if(dense):
+        run('as_slim_line_sum_dense', lambda: as_slim_line_sum(P))
+
+    # Embeddings. embed_in_line_sum expects the point of the polytope
+    # after the coefficient reduction, so it only runs without it
+    x_plane = embed_in_plane_sum(M_updated, U, y_updated)['point']
+    if expansion is None and dense:
+        run('embed_in_line_sum', lambda: embed_in_line_sum(y, M, U))
+    Y = np.repeat(y[None], args.batch, axis=0)
+    X = run('embed_in_line_sum_batch', lambda: embed_in_line_sum_batch(Y, M, U, sparse=not dense))
+
+    # Verifiers
+    run('verify_plane_sums', lambda: P.verify_plane_sums(x_plane))
+    if(dense):
+        run('verify_line_sums', lambda: S_sparse.verify_line_sums(X[0]))
+        run('verify_line_sums_batch', lambda: S_sparse.verify_line_sums_batch(X))
+
+    # Enumeration, bounded by a number of points and a time budget
+    enumeration = {'limit': args.enum_limit, 'time_budget': args.enum_budget}
+    run('count_plane_sum_points', lambda: P.count_integer_points(**enumeration))
+    if(dense):
+        run('count_slim_line_sum_points', lambda: S_sparse.count_integer_points(**enumeration))
+
+    return(results)
+#######################################################
+
+
+#######################################################
+def compare(results, previous):
+    """
+    Prints the ratio of the median times of results and previous for
+    the stages of the instances in both
+    """
+    def medians(data):
+        return({(json.dumps(entry['instance'], sort_keys=True), stage): value['median']
+                for entry in data['results'] for stage, value in entry['stages'].items()
+                if 'median' in value})
+    new, old = medians(results), medians(previous)
+
+    print(f"{'instance':<70} {'stage':<28} {'old (s)':>10} {'new (s)':>10} {'ratio':>7}")
+    for key in sorted(set(new) & set(old)):
+        instance, stage = key
+        ratio = new[key]/old[key] if old[key] > 0 else float('inf')
+        print(f'{instance:<70} {stage:<28} {old[key]:>10.4g} {new[key]:>10.4g} {ratio:>7.2f}')
+#######################################################
+
+
+#######################################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=16, help='points in the batch embedding')
+    parser.add_argument('--enum-limit', type=int, default=1000)
+    parser.add_argument('--enum-budget', type=float, default=1.0, help='seconds')
+    parser.add_argument('--max-dense-bytes', type=int, default=2**28,
+                        help='dense stages and points are skipped above this predicted size')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    args = parser.parse_args()
+
+    results = {'meta': {'preset': args.preset,
+                        'repeat': args.repeat,
+                        'seed': args.seed,
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'scipy': scipy.__version__,
+                        'platform': platform.platform()},
+               'results': []}
+
+    for parameters, M, y in scaling_instances(args.preset, args.seed):
+        stages = benchmark_instance(M, y, parameters['upper_bound'], args)
+        dimensions = stages.pop('dimensions')
+        results['results'].append({'instance': parameters,
+                                   'dimensions': dimensions,
+                                   'stages': stages})
+        total = sum(value['median'] for value in stages.values())
+        print(f"{parameters['curve']:>10}: {json.dumps(parameters)} r={dimensions['r']} "
+              f"c={dimensions['c']} {total:.3f}s", flush=True)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+#######################################################
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The package is imported from the parent directory of this folder, as
+# described in the README
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+from itertools import product
+from trans_polytope_repr import as_plane_sum, slim_line_sum
+
+# The searches of the tests are compared with the exhaustive search over
+# itertools.product of the original get_integer_points, so the instances
+# are kept small
+MAX_CANDIDATES = 50000
+
+#######################################################
+def _baseline_line_sum_points(S, relaxed_coord=None, all=False, n_relax=-1):
+    """
+    Integer points of the slim line-sum polytope S found by checking 
+    every vector of the box of the original get_integer_points
+    """
+    r, c = S.U.shape
+    l = S.W.shape[1]
+    low = np.full((r,c,l), -1 if all else 0)
+    for i, j, k in (relaxed_coord or []):
+        low[i,j,k] = n_relax
+    up = np.zeros((r,c,l), dtype=int)
+    for i in range(r):
+        for j in range(c):
+            for k in range(l):
+                up[i,j,k] = min(S.U[i,j], S.V[i,k], S.W[j,k])
+
+    X = _box(low, up).reshape(-1,r,c,l)
+    keep = ((X.sum(axis=3) == S.U).all(axis=(1,2)) & (X.sum(axis=2) == S.V).all(axis=(1,2)) 
+            & (X.sum(axis=1) == S.W).all(axis=(1,2)))
+    return(list(X[keep]))
+#######################################################
+
+
+#######################################################
+def _baseline_plane_sum_points(P):
+    """
+    Integer points of the plane-sum polytope P found by checking every 
+    vector of the box of the original get_integer_points
+    """
+    r, c, l = len(P.u), len(P.v), len(P.w)
+    given_bounds = P.get_bounds()
+    bounds = np.zeros((r,c,l), dtype=int)
+    for i in range(r):
+        for j in range(c):
+            for k in range(l):
+                bounds[i,j,k] = min(P.u[i], P.v[j], P.w[k], given_bounds[i,j,k])
+
+    X = _box(np.zeros_like(bounds), bounds).reshape(-1,r,c,l)
+    keep = ((X.sum(axis=(2,3)) == P.u).all(axis=1) & (X.sum(axis=(1,3)) == P.v).all(axis=1) 
+            & (X.sum(axis=(1,2)) == P.w).all(axis=1))
+    return(list(X[keep]))
+#######################################################
+
+
+#######################################################
+def _box(low, up):
+    """
+    Returns the integer vectors of the box [low, up] (flattened), one per
+    row, in the order of itertools.product
+    """
+    ranges = [range(int(a), int(b)+1) for a, b in zip(np.ravel(low), np.ravel(up))]
+    return(np.array(list(product(*ranges)), dtype=np.int64).reshape(-1, len(ranges)))
+#######################################################
+
+
+#######################################################
+def _box_size(low, up):
+    return(int(np.prod(np.maximum(np.asarray(up) - np.asarray(low) + 1, 0), dtype=object)))
+#######################################################
+
+
+#######################################################
+def _line_sum_instances(count=150, seed=0):
+    """
+    Returns pairs (S, options) of random slim line-sum polytopes with the 
+    margins of a random point and options of
+    get_integer_points, with at most MAX_CANDIDATES vectors in the box
+    """
+    rng = np.random.default_rng(seed)
+    options = [{}, {'all': True}, {'relaxed_coord': [(0,0,0)]}, 
+               {'relaxed_coord': [(0,1,1), (1,0,0)], 'n_relax': 1}]
+    instances = []
+    while len(instances) < count:
+        # Half of the polytopes are 2x2x2, with a line of points through x
+        if rng.random() < 0.5:
+            r, c, l = 2, 2, 2
+            x = rng.integers(0, 4, size=(r,c,l))
+        else:
+            r, c, l = rng.integers(2, 4), rng.integers(2, 4), rng.integers(2, 4)
+            x = rng.integers(0, 4, size=(r,c,l)) * (rng.random((r,c,l)) < 0.6)
+        S = slim_line_sum(x.sum(axis=2), x.sum(axis=1), x.sum(axis=0))
+        option = options[len(instances) % len(options)]
+        low = np.full((r,c,l), -1 if option.get('all') else 0)
+        for i, j, k in option.get('relaxed_coord', []):
+            low[i,j,k] = option.get('n_relax', -1)
+        up = np.minimum(np.minimum(S.U[:,:,None], S.V[:,None,:]), S.W[None,:,:])
+        if _box_size(low, up) <= MAX_CANDIDATES:
+            instances.append((S, option))
+    return(instances)
+#######################################################
+
+
+#######################################################
+def _plane_sum_instances(count=150, seed=0):
+    """
+    Returns random plane-sum polytopes as_plane_sum(M, U) of tiny 
+    matrices M=(A|b), with at most MAX_CANDIDATES vectors in the box
+    """
+    rng = np.random.default_rng(seed)
+    instances = []
+    while len(instances) < count:
+        nrow, ncol = rng.integers(1, 3), rng.integers(1, 3)
+        A = rng.integers(-1, 3, (nrow, ncol))
+        A[0, ~A.any(axis=0)] = 1
+        P = as_plane_sum(np.column_stack((A, rng.integers(0, 4, nrow))), int(rng.integers(1, 3)))
+        up = np.minimum(P.get_bounds(), np.minimum.outer(np.minimum.outer(P.u, P.v), P.w))
+        if _box_size(0, up) <= MAX_CANDIDATES:
+            instances.append(P)
+    return(instances)
+#######################################################
+
+
+#######################################################
+def _assert_same_points(points, expected):
+    assert len(points) == len(expected)
+    for x, y in zip(points, expected):
+        assert np.array_equal(x, y)
+#######################################################
+
+
+#######################################################
+def test_line_sum_points_match_baseline():
+    for S, option in _line_sum_instances():
+        _assert_same_points(S.get_integer_points(**option), _baseline_line_sum_points(S, **option))
+#######################################################
+
+
+#######################################################
+def test_plane_sum_points_match_baseline():
+    for P in _plane_sum_instances():
+        _assert_same_points(P.get_integer_points(), _baseline_plane_sum_points(P))
+#######################################################
+
+
+#######################################################
+def test_limit_time_budget_and_count():
+    for S, option in _line_sum_instances(count=40, seed=1):
+        expected = _baseline_line_sum_points(S, **option)
+        assert S.count_integer_points(**option) == len(expected)
+        for limit in (0, 1, 2):
+            _assert_same_points(list(S.iter_integer_points(**option, limit=limit)), 
+                                expected[:limit])
+            assert S.count_integer_points(**option, limit=limit) == min(limit, len(expected))
+        _assert_same_points(list(S.iter_integer_points(**option, time_budget=3600)), expected)
+        # A search stopped by its time budget generates a prefix of the points
+        stopped = list(S.iter_integer_points(**option, time_budget=0))
+        _assert_same_points(stopped, expected[:len(stopped)])
+    for P in _plane_sum_instances(count=40, seed=1):
+        expected = _baseline_plane_sum_points(P)
+        assert P.count_integer_points() == len(expected)
+        _assert_same_points(list(P.iter_integer_points(limit=1)), expected[:1])
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('workers', [2, 3])
+def test_workers_keep_the_order(workers):
+    for S, option in _line_sum_instances(count=8, seed=2):
+        expected = _baseline_line_sum_points(S, **option)
+        _assert_same_points(S.get_integer_points(**option, workers=workers), expected)
+        assert S.count_integer_points(**option, workers=workers) == len(expected)
+        _assert_same_points(list(S.iter_integer_points(**option, workers=workers, limit=1)), 
+                            expected[:1])
+    for P in _plane_sum_instances(count=8, seed=2):
+        _assert_same_points(P.get_integer_points(workers=workers), _baseline_plane_sum_points(P))
+#######################################################
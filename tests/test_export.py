@@ -0,0 +1,23 @@
+import numpy as np
+from trans_polytope_repr import slim_line_sum
+from trans_polytope_repr.export import _number
+
+#######################################################
+def test_large_integers_are_written_exactly(tmp_path):
+    big = 2**60 + 1
+    S = slim_line_sum(np.array([[big]]), np.array([[big, 5, 7]]), np.array([[big, 3, 1]]))
+    for method, name in ((S.to_mps, 'S.mps'), (S.to_lp, 'S.lp')):
+        method(tmp_path / name)
+        text = (tmp_path / name).read_text()
+        assert str(big) in text
+        assert 'e+' not in text
+#######################################################
+
+
+#######################################################
+def test_number():
+    assert _number(2**70) == str(2**70)
+    assert _number(np.int64(-3)) == '-3'
+    assert _number(3.0) == '3'
+    assert _number(0.1) == f'{0.1:.17g}'
+#######################################################
@@ -0,0 +1,62 @@
+import importlib
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from trans_polytope_repr import as_plane_sum, as_slim_line_sum
+from trans_polytope_repr import backends
+from trans_polytope_repr.dtypes import _value_dtype
+
+slim_line_sum_module = importlib.import_module('trans_polytope_repr.slim_line_sum')
+_as_slim_line_sum_loops = slim_line_sum_module._as_slim_line_sum_loops
+
+#######################################################
+def _instances(count=60, seed=0):
+    """
+    Returns random plane-sum polytopes as_plane_sum(M, U) of small
+    matrices M=(A|b) without zero columns, with upper bounds that give
+    margins of all the types of dtypes.py
+    """
+    rng = np.random.default_rng(seed)
+    polytopes = [as_plane_sum(np.array([[0, 1], [5, 1]]), 2)]
+    for _ in range(count):
+        nrow, ncol = rng.integers(1, 4), rng.integers(1, 5)
+        A = rng.integers(-3, 4, (nrow, ncol))
+        A[0, ~A.any(axis=0)] = 1
+        M = np.column_stack((A, rng.integers(0, 6, nrow)))
+        U = int(rng.choice([1, 2, 3, 200, 70000]))
+        polytopes.append(as_plane_sum(M, U))
+    return(polytopes)
+#######################################################
+
+
+#######################################################
+@pytest.fixture
+def uncompiled_numba(monkeypatch):
+    """
+    Runs the 'numba' backend of as_slim_line_sum with the kernels of
+    backends.py called as Python functions, so it is tested without 
+    numba
+    """
+    monkeypatch.setattr(slim_line_sum_module, '_resolve_backend', lambda backend: backend)
+    monkeypatch.setattr(slim_line_sum_module, '_kernel', lambda name: getattr(backends, name))
+#######################################################
+
+
+#######################################################
+def _dense(a):
+    return(a.toarray() if sp.issparse(a) else a)
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('sparse, backend', [(False, 'numpy'), (True, 'numpy'), 
+                                             (False, 'numba')])
+def test_matches_reference(sparse, backend, uncompiled_numba):
+    for P in _instances():
+        S = as_slim_line_sum(P, sparse=sparse, backend=backend)
+        R = _as_slim_line_sum_loops(P)
+        assert S.is_sparse == sparse
+        for a, a_ref in ((S.U, R.U), (S.V, R.V), (S.W, R.W)):
+            assert np.array_equal(_dense(a).astype(object), a_ref)
+            assert a.dtype == _value_dtype(a_ref)
+#######################################################
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from trans_polytope_repr import as_plane_sum, as_slim_line_sum
+from trans_polytope_repr import plane_sum_entry_forbidden, slim_line_sum
+
+#######################################################
+def _instances(count=20, seed=0):
+    """
+    Returns random plane-sum polytopes as_plane_sum(M, U) of small 
+    matrices M=(A|b) without zero columns
+    """
+    rng = np.random.default_rng(seed)
+    polytopes = []
+    for _ in range(count):
+        nrow, ncol = rng.integers(1, 4), rng.integers(1, 5)
+        A = rng.integers(-3, 4, (nrow, ncol))
+        A[0, ~A.any(axis=0)] = 1
+        M = np.column_stack((A, rng.integers(0, 6, nrow)))
+        polytopes.append(as_plane_sum(M, int(rng.choice([0, 1, 3, 200, 70000]))))
+    return(polytopes)
+#######################################################
+
+
+#######################################################
+def _assert_same_object(a, b):
+    """
+    Checks that the attributes of the objects a and b have the same 
+    values and types
+    """
+    assert type(a) is type(b)
+    assert a.__dict__.keys() == b.__dict__.keys()
+    for name, x in a.__dict__.items():
+        y = b.__dict__[name]
+        if x is None or isinstance(x, (plane_sum_entry_forbidden, slim_line_sum)):
+            assert (y is None) == (x is None)
+            if x is not None:
+                _assert_same_object(x, y)
+            continue
+        assert sp.issparse(x) == sp.issparse(y)
+        if sp.issparse(x):
+            x, y = x.toarray(), y.toarray()
+        assert x.dtype == y.dtype
+        assert np.array_equal(x, y)
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('mmap', [True, False])
+def test_plane_sum_round_trip(tmp_path, mmap):
+    for index, P in enumerate(_instances()):
+        path = tmp_path / f'{index}.slim'
+        P.save(path)
+        _assert_same_object(plane_sum_entry_forbidden.load(path, mmap=mmap), P)
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('sparse', [False, True])
+def test_slim_line_sum_round_trip(tmp_path, mmap, sparse):
+    for index, P in enumerate(_instances()):
+        S = as_slim_line_sum(P, sparse=sparse)
+        path = tmp_path / f'{index}.slim'
+        S.save(path)
+        T = slim_line_sum.load(path, mmap=mmap)
+        _assert_same_object(T, S)
+        assert isinstance(T.V, np.memmap) == (mmap and T.V.size > 0)
+        # The loaded polytope can still be used, e.g. with a new rhs
+        b_new = np.arange(len(P.neg_sums))
+        _assert_same_object(T.with_rhs(b_new), S.with_rhs(b_new))
+#######################################################
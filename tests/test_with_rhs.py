@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from trans_polytope_repr import as_plane_sum, as_slim_line_sum, representation_cache
+
+BOUNDS = [0, 1, 2, 3, 200, 70000]
+
+#######################################################
+def _instances(count=40, seed=0):
+    """
+    Returns random small matrices M=(A|b) without zero columns, with an 
+    upper bound U and a new right hand side b_new and upper bound U_new
+    (of all the types of dtypes.py, and equal to 0 or to U for some)
+    """
+    rng = np.random.default_rng(seed)
+    instances = []
+    for index in range(count):
+        nrow, ncol = rng.integers(1, 4), rng.integers(1, 5)
+        A = rng.integers(-3, 4, (nrow, ncol))
+        A[0, ~A.any(axis=0)] = 1
+        M = np.column_stack((A, rng.integers(0, 6, nrow)))
+        U = 0 if index % 8 == 0 else int(rng.choice(BOUNDS))
+        U_new = U if index % 8 == 1 else int(rng.choice(BOUNDS))
+        instances.append((M, U, rng.integers(0, 6, nrow), U_new))
+    return(instances)
+#######################################################
+
+
+#######################################################
+def _assert_same_array(a, b):
+    assert sp.issparse(a) == sp.issparse(b)
+    if sp.issparse(a):
+        a, b = a.toarray(), b.toarray()
+    assert a.dtype == b.dtype
+    assert np.array_equal(a.astype(object), b.astype(object))
+#######################################################
+
+
+#######################################################
+def _assert_same_plane_sum(P, Q):
+    for name in ('u', 'v', 'w', 'neg_sums', 'bound_sums_ij', 'bound_sums_k'):
+        _assert_same_array(getattr(P, name), getattr(Q, name))
+    assert np.array_equal(np.unique(P.Enabled, axis=0), np.unique(Q.Enabled, axis=0))
+#######################################################
+
+
+#######################################################
+def _assert_same_slim_line_sum(S, T):
+    for name in ('U', 'V', 'W'):
+        _assert_same_array(getattr(S, name), getattr(T, name))
+    _assert_same_plane_sum(S.plane_sum, T.plane_sum)
+#######################################################
+
+
+#######################################################
+def test_plane_sum_with_rhs():
+    for M, U, b_new, U_new in _instances():
+        P = as_plane_sum(M, U).with_rhs(b_new, U_new)
+        _assert_same_plane_sum(P, as_plane_sum(np.column_stack((M[:, :-1], b_new)), U_new))
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('sparse', [False, True])
+def test_slim_line_sum_with_rhs(sparse):
+    # The instances built with U=0 go through the branch that builds the 
+    # new representation from scratch, and the ones with a new U != 0 
+    # through the one that rescales U, V and the bound sums
+    for M, U, b_new, U_new in _instances():
+        S = as_slim_line_sum(as_plane_sum(M, U), sparse=sparse).with_rhs(b_new, U_new)
+        M_new = np.column_stack((M[:, :-1], b_new))
+        _assert_same_slim_line_sum(S, as_slim_line_sum(as_plane_sum(M_new, U_new), sparse=sparse))
+#######################################################
+
+
+#######################################################
+@pytest.mark.parametrize('sparse', [False, True])
+def test_cache_partial_hit(sparse):
+    for M, U, b_new, U_new in _instances(seed=1):
+        M_new = np.column_stack((M[:, :-1], b_new))
+        cache = representation_cache()
+        cache.get(M, U, sparse=sparse)
+        d = cache.get(M_new, U_new, sparse=sparse)
+        assert (cache.misses, cache.partial_hits, cache.hits) == (1, 1, 0)
+
+        d_ref = representation_cache().get(M_new, U_new, sparse=sparse)
+        _assert_same_array(d['prep'], d_ref['prep'])
+        assert (d['expansion'] is None) == (d_ref['expansion'] is None)
+        if d['expansion'] is not None:
+            _assert_same_array(d['expansion'], d_ref['expansion'])
+        _assert_same_plane_sum(d['plane_sum'], d_ref['plane_sum'])
+        _assert_same_slim_line_sum(d['slim_line_sum'], d_ref['slim_line_sum'])
+#######################################################
@@ -1,16 +1,59 @@
-from .preprocessing import prep_rep
-from .plane_sum import plane_sum_entry_forbidden, as_plane_sum
-from .slim_line_sum import slim_line_sum, as_slim_line_sum
-from .embedding import embed_in_plane_sum, embed_plane_sum_in_line_sum, embed_in_line_sum, slim_line_sum_representation
-
-__all__ = [
-    'prep_rep',
-    'plane_sum_entry_forbidden',
-    'as_plane_sum',
-    'slim_line_sum',
-    'as_slim_line_sum',
-    'embed_in_plane_sum',
-    'embed_plane_sum_in_line_sum',
-    'embed_in_line_sum',
-    'slim_line_sum_representation'
-]
\ No newline at end of file
+import sys
+from types import ModuleType
+
+# The public names are imported from their modules the first time they
+# are used, so that importing the package (e.g. to run the command line
+# interface in __main__.py) does not import numpy and scipy
+_MODULES = {
+    'prep_rep': 'preprocessing',
+    'plane_sum_entry_forbidden': 'plane_sum',
+    'as_plane_sum': 'plane_sum',
+    'slim_line_sum': 'slim_line_sum',
+    'as_slim_line_sum': 'slim_line_sum',
+    'lazy_slim_line_sum': 'lazy',
+    'embed_in_plane_sum': 'embedding',
+    'embed_plane_sum_in_line_sum': 'embedding',
+    'embed_in_line_sum': 'embedding',
+    'embed_in_line_sum_batch': 'embedding',
+    'slim_line_sum_representation': 'embedding',
+    'TransportationEmbedding': 'embedding',
+    'representation_cache': 'cache',
+    'plan_representation': 'planning',
+    'represent_many': 'batch'
+}
+
+__all__ = list(_MODULES)
+
+#######################################################
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+    value = getattr(import_module(f'.{_MODULES[name]}', __name__), name)
+    globals()[name] = value
+    return(value)
+#######################################################
+
+
+#######################################################
+def __dir__():
+    return(sorted(set(globals()) | set(__all__)))
+#######################################################
+
+
+#######################################################
+class _package(ModuleType):
+    """
+    Type of this module. Importing the submodule slim_line_sum sets it 
+    as an attribute of the package, which would hide the class 
+    slim_line_sum, so the submodules with the name of a public name are
+    not set as attributes (they are still found in sys.modules)
+    """
+    def __setattr__(self, name, value):
+        if name in _MODULES and isinstance(value, ModuleType):
+            return
+        super().__setattr__(name, value)
+#######################################################
+
+
+sys.modules[__name__].__class__ = _package
@@ -0,0 +1,298 @@
+"""
+Command line interface to build the slim line-sum representations of a
+stream of instances, e.g.
+
+    python -m trans_polytope_repr instances.jsonl --output-dir out --workers 4
+
+Every line of a JSONL file (or of the standard input, with '-') is an
+instance {"M": [[...]], "U": 3} with the matrix M=(A|b) (or "A" and "b")
+and the upper bound U, and optionally "points", a point y of
+P = {y>=0 : Ay=b} or a list of points, and "id", the name of its files.
+An .npz file holds the arrays M, U and points of one instance, or the
+arrays M_<id>, U_<id> and points_<id> of several ones.
+
+The representation of each instance is written to <id>.slim (see
+slim_line_sum.save), <id>.mps or <id>.lp as soon as it is built, and its
+points are embedded in it (see TransportationEmbedding.forward) and
+written to <id>.points.npy (or <id>.points.npz with --sparse). A line of
+JSON with the timings of each instance is written to the standard output
+(or to --report) and the throughput to the standard error at the end.
+
+Only the standard library is imported until an instance is built, and
+with --workers above 1 JSONL instances are parsed in this process and
+built in the workers, so numpy and scipy are only imported by them. 
+The exceptions are .npz input, which is read with numpy, and 
+--max-memory, whose sizes are planned in this process before the
+instances are started (see plan_representation).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+#######################################################
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = (args.output_dir, args.format, args.sparse, args.fused, args.backend)
+    instances = _read_instances(args.input, args.upper_bound)
+
+    report = sys.stdout if args.report is None else open(args.report, 'w')
+    start = time.perf_counter()
+    done, failed, written = 0, 0, 0
+    try:
+        for record in _convert_all(instances, options, args.workers, args.max_memory):
+            report.write(json.dumps(record) + '\n')
+            report.flush()
+            done += 1
+            failed += 'error' in record
+            written += record.get('bytes', 0)
+    except (OSError, ValueError) as error:
+        # The errors of the instances are in their records, so these are 
+        # errors reading the input
+        print(f'{done} instances written, error reading {args.input}: {error}', file=sys.stderr)
+        return(2)
+    finally:
+        if report is not sys.stdout:
+            report.close()
+
+    seconds = time.perf_counter() - start
+    rate = done/seconds if seconds > 0 else float('inf')
+    print(f'{done} instances in {seconds:.3f} s ({rate:.1f} instances/s, '
+          f'{written/max(seconds, 1e-9)/2**20:.1f} MiB/s written), {failed} failed',
+          file=sys.stderr)
+    return(1 if failed else 0)
+#######################################################
+
+
+#######################################################
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m trans_polytope_repr',
+        description='Builds the slim line-sum representations of the instances (A|b) of a '
+                    'JSONL or .npz file and writes them to a directory.')
+    parser.add_argument('input', help="JSONL or .npz file with the instances ('-' for JSONL "
+                                      "from the standard input)")
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help='directory where the files of the instances are written')
+    parser.add_argument('-f', '--format', choices=('slim', 'mps', 'lp'), default='slim',
+                        help='format of the representations (default: slim, the binary '
+                             'format of slim_line_sum.save)')
+    parser.add_argument('-U', '--upper-bound', type=int, default=None,
+                        help='upper bound of the instances without one')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of processes (default: 1, in this process)')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='maximum number of bytes of the predicted sizes of the '
+                             'representations built at the same time')
+    parser.add_argument('--sparse', action='store_true',
+                        help='store U and W as sparse matrices, and the points as .npz')
+    parser.add_argument('--fused', action='store_true',
+                        help='run the stages on the nonzero entries (see '
+                             'slim_line_sum_representation)')
+    parser.add_argument('--backend', choices=('numpy', 'numba'), default=None,
+                        help='backend of Stages 2 and 3 (see backends.py)')
+    parser.add_argument('--report', default=None,
+                        help='file for the timings of the instances (default: standard output)')
+    return(parser)
+#######################################################
+
+
+#######################################################
+def _read_instances(path, upper_bound):
+    """
+    Generator of the instances (id, M, U, points) of the file path, read
+    one at a time. points is None for the instances without points.
+    """
+    if path.endswith('.npz'):
+        return(_read_npz(path, upper_bound))
+    return(_read_jsonl(path, upper_bound))
+#######################################################
+
+
+#######################################################
+def _read_jsonl(path, upper_bound):
+    stream = sys.stdin if path == '-' else open(path)
+    try:
+        index = 0
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            instance = json.loads(line)
+            if 'M' in instance:
+                M = instance['M']
+            elif 'A' in instance and 'b' in instance:
+                M = [list(row) + [b] for row, b in zip(instance['A'], instance['b'])]
+            else:
+                raise ValueError(f'Line {number} of {path} has neither M nor A and b')
+            U = _instance_bound(instance.get('U'), upper_bound, f'line {number}')
+            yield(_instance_id(instance.get('id', index)), M, U, instance.get('points'))
+            index += 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+#######################################################
+
+
+#######################################################
+def _read_npz(path, upper_bound):
+    import numpy as np
+    with np.load(path) as data:
+        # The instances are the suffixes of the arrays M_<id> (or A_<id>),
+        # in the order of the file, and '' for the arrays M, U and points
+        ids = []
+        for key in data.files:
+            name, _, suffix = key.partition('_')
+            if name in ('M', 'A') and suffix not in ids:
+                ids.append(suffix)
+        for index, suffix in enumerate(ids):
+            key = (lambda name: f'{name}_{suffix}' if suffix else name)
+            if key('M') in data.files:
+                M = data[key('M')]
+            elif key('b') in data.files:
+                M = np.column_stack((data[key('A')], data[key('b')]))
+            else:
+                raise ValueError(f'{path} has {key("A")} but not {key("b")}')
+            U = data[key('U')].item() if key('U') in data.files else None
+            U = _instance_bound(U, upper_bound, f'instance {suffix or index} of {path}')
+            points = data[key('points')] if key('points') in data.files else None
+            yield(_instance_id(suffix or index), M, U, points)
+#######################################################
+
+
+#######################################################
+def _instance_bound(U, upper_bound, where):
+    if U is None:
+        U = upper_bound
+    if U is None:
+        raise ValueError(f'The upper bound of {where} is not given, use --upper-bound')
+    return(U)
+#######################################################
+
+
+#######################################################
+def _instance_id(name):
+    name = str(name)
+    if not name or os.path.basename(name) != name or name in ('.', '..'):
+        raise ValueError(f'{name!r} is not a valid name for the files of an instance')
+    return(name)
+#######################################################
+
+
+#######################################################
+def _convert_all(instances, options, workers, max_memory):
+    """
+    Generator of the records of _convert for the instances, in the order
+    in which they are finished. With several workers, at most 2*workers
+    instances are read ahead of the ones that are finished, and as in
+    represent_many, an instance is only started when the predicted sizes
+    of the representations being built fit in max_memory, or when no
+    other one is being built. If reading an instance fails, no more are
+    read, and the error is raised after the records of the instances 
+    already started.
+    """
+    if workers <= 1:
+        for instance in instances:
+            yield(_convert(*instance, *options))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    executor = ProcessPoolExecutor(workers)
+    try:
+        running = {}
+        used = 0
+        instances = iter(instances)
+        pending, error = _next_instance(instances)
+        while pending is not None or running:
+            while pending is not None and len(running) < 2*workers:
+                size = 0 if max_memory is None else _predicted_size(pending, options)
+                if max_memory is not None and running and used + size > max_memory:
+                    break
+                running[executor.submit(_convert, *pending, *options)] = size
+                used += size
+                pending, error = _next_instance(instances)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                used -= running.pop(future)
+                yield(future.result())
+        if error is not None:
+            raise error
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+#######################################################
+
+
+#######################################################
+def _next_instance(instances):
+    """
+    Returns the next instance of the iterator instances (None at the end)
+    and None, or None and the error raised reading it
+    """
+    try:
+        return(next(instances, None), None)
+    except (OSError, ValueError) as error:
+        return(None, error)
+#######################################################
+
+
+#######################################################
+def _predicted_size(instance, options):
+    """
+    Returns the predicted bytes of the representation of instance, or 0
+    if it cannot be planned, so that _convert records its error
+    """
+    import numpy as np
+    from .planning import plan_representation
+    from .batch import _predicted_bytes
+    _, M, U, _ = instance
+    try:
+        return(_predicted_bytes(plan_representation(np.asarray(M), U), options[2]))
+    except Exception:
+        return(0)
+#######################################################
+
+
+#######################################################
+def _convert(name, M, U, points, output_dir, output_format, sparse, fused, backend):
+    """
+    Builds the representation of one instance and writes it, and its
+    points, to output_dir. Returns a dictionary with the id, the shape
+    (r, c) of the representation, the seconds spent building it and in
+    total, the files written and their bytes, or the error raised.
+    """
+    start = time.perf_counter()
+    try:
+        import numpy as np
+        from .embedding import slim_line_sum_representation
+        embedding = points is not None
+        S = slim_line_sum_representation(np.asarray(M), U, sparse=sparse, embedding=embedding,
+                                         backend=backend, fused=fused)
+        if(embedding):
+            S, E = S
+        built = time.perf_counter()
+
+        files = [os.path.join(output_dir, f'{name}.{output_format}')]
+        {'slim': S.save, 'mps': S.to_mps, 'lp': S.to_lp}[output_format](files[0])
+        if(embedding):
+            X = E.forward(np.asarray(points), sparse=sparse)
+            if(sparse):
+                import scipy.sparse as sp
+                files.append(os.path.join(output_dir, f'{name}.points.npz'))
+                sp.save_npz(files[-1], X)
+            else:
+                files.append(os.path.join(output_dir, f'{name}.points.npy'))
+                np.save(files[-1], X)
+    except Exception as error:
+        return({'id': name, 'error': f'{type(error).__name__}: {error}',
+                'seconds': time.perf_counter() - start})
+
+    return({'id': name, 'r': S.U.shape[0], 'c': S.U.shape[1], 'build_seconds': built - start,
+            'seconds': time.perf_counter() - start, 'files': files,
+            'bytes': sum(os.path.getsize(path) for path in files)})
+#######################################################
+
+
+if __name__ == '__main__':
+    sys.exit(main())
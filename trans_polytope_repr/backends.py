@@ -0,0 +1,163 @@
+import numpy as np
+import warnings
+
+# Backends accepted by the 'backend' argument of the functions of the
+# package. With 'numba' the loops below are compiled with numba.njit
+# the first time they are used, and the compiled code is cached on disk
+# (cache=True) so that new processes do not compile them again.
+BACKENDS = ('numpy', 'numba')
+_compiled = {}
+
+#######################################################
+def _resolve_backend(backend):
+    """
+    Returns the backend to use for the value of a 'backend' argument.
+    None means 'numpy', and 'numba' falls back to 'numpy' with a
+    warning when numba is not installed.
+    """
+    if backend is None:
+        return('numpy')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'numba' and not _numba_available():
+        warnings.warn("numba is not installed, using the 'numpy' backend", RuntimeWarning,
+                      stacklevel=3)
+        return('numpy')
+    return(backend)
+#######################################################
+
+
+#######################################################
+def _kernel(name):
+    """
+    Returns the compiled version of the function name of this module
+    """
+    if name not in _compiled:
+        import numba
+        _compiled[name] = numba.njit(cache=True)(globals()[name])
+    return(_compiled[name])
+#######################################################
+
+
+#######################################################
+def _numba_available():
+    try:
+        import numba
+    except ImportError:
+        return(False)
+    return(True)
+#######################################################
+
+
+# The functions below are written in the subset of Python supported by
+# numba. They can also be called without compiling them, which is only
+# useful to check them.
+
+#######################################################
+def _enabled_labels(rows, cols, vals, start, s, nrow, Enabled):
+    """
+    Fills the 3rd entry of the enabled triplets of _plane_sum_layout.
+    The nonzero entries (rows, cols, vals) of A must be sorted by column
+    and then by row. The triplets of column k start at position
+    2*start[k], the s[k] positive ones followed by the s[k] negative
+    ones.
+    """
+    Enabled[:, 2] = nrow
+    pos_taken = np.zeros(len(s), dtype=np.int64)
+    neg_taken = np.zeros(len(s), dtype=np.int64)
+    for e in range(len(vals)):
+        k = cols[e]
+        if vals[e] > 0:
+            for _ in range(vals[e]):
+                Enabled[2*start[k] + pos_taken[k], 2] = rows[e]
+                pos_taken[k] += 1
+        elif vals[e] < 0:
+            for _ in range(-vals[e]):
+                Enabled[2*start[k] + s[k] + neg_taken[k], 2] = rows[e]
+                neg_taken[k] += 1
+#######################################################
+
+
+#######################################################
+def _embed_plane_sum(Enabled, s, y, U, x):
+    """
+    Fills the point x of embed_in_plane_sum: the positive triplets of
+    the k-th column take the value y[k] and the negative ones U-y[k]
+    """
+    marker = 0
+    for k in range(len(s)):
+        for _ in range(s[k]):
+            x[Enabled[marker, 0], Enabled[marker, 1], Enabled[marker, 2]] = y[k]
+            marker += 1
+        for _ in range(s[k]):
+            x[Enabled[marker, 0], Enabled[marker, 1], Enabled[marker, 2]] = U - y[k]
+            marker += 1
+#######################################################
+
+
+#######################################################
+def _slim_dense_U(cells, m, n, l, e, U_bound, U):
+    """
+    Fills the dense rxc array U of as_slim_line_sum from the enabled
+    cells of the plane-sum polytope
+    """
+    for q in range(len(cells)):
+        U[cells[q, 0]*m + cells[q, 1], cells[q, 2]] = e
+    for row in range(U.shape[0]):
+        U[row, n + row // m] = U_bound
+        U[row, n + l + row % m] = U_bound
+#######################################################
+
+
+#######################################################
+def _plane_sums_match(X, u, v, w, su, sv, sw, flags):
+    """
+    Sets flags[q] to True if the sums of the planes of X[q] are given
+    by u, v and w. The sums are accumulated in the vectors su, sv and 
+    sw of lengths r, c and l.
+    """
+    r, c, l = X.shape[1], X.shape[2], X.shape[3]
+    for q in range(X.shape[0]):
+        su[:] = 0
+        sv[:] = 0
+        sw[:] = 0
+        for a in range(r):
+            for b in range(c):
+                for t in range(l):
+                    value = X[q, a, b, t]
+                    su[a] += value
+                    sv[b] += value
+                    sw[t] += value
+        flags[q] = np.all(su == u) and np.all(sv == v) and np.all(sw == w)
+#######################################################
+
+
+#######################################################
+def _line_sums_match(X, U, V, W, su, sv, sw, flags):
+    """
+    Sets flags[q] to True if the sums of the lines of X[q] are given
+    by U, V and W. The lines of U are checked while they are summed, so
+    most points that do not match are discarded early. The sums are 
+    accumulated in the arrays su, sv and sw of shapes (c,), (r,l) and 
+    (c,l).
+    """
+    r, c, l = X.shape[1], X.shape[2], X.shape[3]
+    for q in range(X.shape[0]):
+        sv[:, :] = 0
+        sw[:, :] = 0
+        match = True
+        for a in range(r):
+            for b in range(c):
+                su[b] = 0
+                for t in range(l):
+                    value = X[q, a, b, t]
+                    su[b] += value
+                    sv[a, t] += value
+                    sw[b, t] += value
+                if su[b] != U[a, b]:
+                    match = False
+                    break
+            if not match:
+                break
+        flags[q] = match and np.all(sv == V) and np.all(sw == W)
+#######################################################
@@ -0,0 +1,108 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .embedding import slim_line_sum_representation
+from .planning import plan_representation
+
+#######################################################
+def represent_many(instances, workers=None, sparse=False, output_dir=None, max_memory=None,
+                   progress=None):
+    """
+    Builds the slim line-sum representations of many polytopes over a
+    pool of processes. The instances are started from the largest to
+    the smallest predicted size (see plan_representation) and the
+    representations are generated as they are finished, so they do not
+    come in the order of the input.
+
+    Input
+        - instances: iterable of pairs (M, U) with an array M=(A|b) 
+          and an upper bound U
+    Optional input
+        - workers: number of processes (None or 1 to build them in this
+          process)
+        - sparse: as in slim_line_sum_representation
+        - output_dir: directory where every representation is saved as
+          '<index>.slim' (see slim_line_sum.save) by the process that
+          builds it, instead of being sent back to this one
+        - max_memory: maximum number of bytes of the predicted sizes of
+          the representations built at the same time. An instance
+          larger than max_memory is only started when no other one is
+          being built
+        - progress: function called with messages about the jobs
+    Output
+        Generator of pairs (index, S) where index is the position of
+        the instance in the input and S is its 'slim_line_sum' object,
+        or the path of the file where it was saved if output_dir is
+        given. The exceptions raised while building an instance are
+        raised by the generator.
+    """
+    instances = list(instances)
+    sizes = [_predicted_bytes(plan_representation(M, U), sparse) for M, U in instances]
+    order = deque(sorted(range(len(instances)), key=lambda i: -sizes[i]))
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if workers is None or workers <= 1:
+        for i in order:
+            yield(i, _represent(i, *instances[i], sparse, output_dir))
+        return
+
+    executor = ProcessPoolExecutor(workers)
+    try:
+        running = {}
+        used = 0
+        finished = 0
+        while order or running:
+            # The largest instance that fits in the memory left is started
+            while order and len(running) < workers:
+                i = _next_instance(order, sizes, used, max_memory, len(running) == 0)
+                if i is None:
+                    break
+                future = executor.submit(_represent, i, *instances[i], sparse, output_dir)
+                running[future] = i
+                used += sizes[i]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                used -= sizes[i]
+                finished += 1
+                if(progress is not None):
+                    progress(f'{finished}/{len(instances)} representations built.')
+                yield(i, future.result())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+#######################################################
+
+
+#######################################################
+def _next_instance(order, sizes, used, max_memory, idle):
+    """
+    Removes from order (sorted by decreasing size) and returns the first
+    instance that fits in the memory left, or None if there is none
+    """
+    if max_memory is None or idle:
+        return(order.popleft())
+    for position, i in enumerate(order):
+        if used + sizes[i] <= max_memory:
+            del order[position]
+            return(i)
+    return(None)
+#######################################################
+
+
+#######################################################
+def _predicted_bytes(plan, sparse):
+    return(plan['sparse_bytes'] if sparse else plan['dense_bytes'])
+#######################################################
+
+
+#######################################################
+def _represent(index, M, U, sparse, output_dir):
+    S = slim_line_sum_representation(M, U, sparse=sparse)
+    if output_dir is None:
+        return(S)
+    path = os.path.join(output_dir, f'{index}.slim')
+    S.save(path)
+    return(path)
+#######################################################
@@ -0,0 +1,186 @@
+import numpy as np
+import scipy.sparse as sp
+import hashlib
+from collections import OrderedDict
+from .plane_sum import as_plane_sum, plane_sum_entry_forbidden
+from .slim_line_sum import as_slim_line_sum, slim_line_sum
+from .preprocessing import _rhs_dtype
+from .embedding import _stage_one
+
+#######################################################
+class representation_cache:
+    """
+    LRU cache of the intermediate results of slim_line_sum_representation
+    (see the 'cache' argument of that function). 
+
+    The entries are keyed by a hash of the content of (A, b, U) and hold
+    the output of prep_rep, the 'plane_sum_entry_forbidden' object and 
+    the 'slim_line_sum' objects. The part of the representation that 
+    only depends on A is also kept under a hash of A, so a matrix that 
+    was seen before with a different b or U only needs the margins to 
+    be recomputed (see the with_rhs methods). The objects returned by 
+    the cache are shared between calls and should not be modified. 
+
+    Attributes
+        max_bytes: memory budget of the cache
+        nbytes: estimated memory used by the entries in the cache
+        hits: number of lookups of a known (A, b, U)
+        partial_hits: number of lookups of a known A with a new (b, U)
+        misses: number of lookups of an unknown A
+        evictions: number of entries evicted to stay within max_bytes
+    """
+    def __init__(self, max_bytes=2**30):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return(len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def get(self, M, U, sparse=False, backend=None):
+        """
+        Input
+            - M: Array M=(A|b) representing a polytope {x>=0 : Ax=b} 
+            - U: Upper bound for the entries of the polytope
+        Optional input
+            - sparse: as in as_slim_line_sum
+            - backend: backend of as_plane_sum and as_slim_line_sum when
+              they are computed (see backends.py). The results do not 
+              depend on it, so it is not part of the key
+        Output
+            - d: a dictionary with the following information
+                prep: the array M after the coefficient reduction
+                expansion: sparse matrix of the binary expansion of 
+                    the coefficient reduction (None if M is not reduced)
+                plane_sum: the 'plane_sum_entry_forbidden' object
+                slim_line_sum: the 'slim_line_sum' object
+        """
+        M = np.asarray(M)
+        A_key = _content_hash(M[:, :-1])
+        key = (A_key, _content_hash(M[:, -1]), repr(U))
+
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            layout = self._lookup(A_key)
+            if layout is not None:
+                self.partial_hits += 1
+                entry = _entry_from_layout(layout, M, U)
+            else:
+                self.misses += 1
+                M_updated, expansion = _stage_one(M)
+                entry = {'prep': M_updated, 
+                         'expansion': expansion, 
+                         'plane_sum': as_plane_sum(M_updated, U, backend=backend), 
+                         'slim_line_sum': {}}
+                A_updated = M_updated[:, :-1]
+                layout = {'A': A_updated, 
+                          'expansion': expansion, 
+                          'plane_sum': entry['plane_sum'], 
+                          'slim_line_sum': {}}
+                self._store(A_key, layout)
+            self._store(key, entry)
+
+        if sparse not in entry['slim_line_sum']:
+            layout = self._lookup(A_key)
+            if layout is not None and sparse in layout['slim_line_sum']:
+                S = layout['slim_line_sum'][sparse].with_rhs(entry['prep'][:, -1], U)
+            else:
+                S = as_slim_line_sum(entry['plane_sum'], sparse=sparse, backend=backend)
+                if layout is not None:
+                    layout['slim_line_sum'][sparse] = S
+                    self._store(A_key, layout)
+            entry['slim_line_sum'][sparse] = S
+            self._store(key, entry)
+
+        d = dict(entry)
+        d['slim_line_sum'] = entry['slim_line_sum'][sparse]
+        return(d)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return(entry[0])
+        return(None)
+
+    def _store(self, key, value):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self.nbytes -= old_size
+            self.evictions += 1
+#######################################################
+
+
+#######################################################
+def _entry_from_layout(layout, M, U):
+    """
+    Builds a cache entry for M=(A|b) and U from the layout stored for A, 
+    recomputing only the margins. 
+    """
+    A_updated = layout['A']
+    b = M[:, -1]
+    d = np.concatenate((np.zeros(A_updated.shape[0] - len(b), dtype=b.dtype), b))
+    if layout['expansion'] is None:
+        M_updated = np.array(M)
+    else:
+        M_updated = np.zeros((A_updated.shape[0], A_updated.shape[1]+1), dtype=_rhs_dtype(d))
+        M_updated[:, :-1] = A_updated
+        M_updated[:, -1] = d
+
+    return({'prep': M_updated, 
+            'expansion': layout['expansion'], 
+            'plane_sum': layout['plane_sum'].with_rhs(d, U), 
+            'slim_line_sum': {}})
+#######################################################
+
+
+#######################################################
+def _content_hash(a):
+    a = np.asarray(a)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((a.dtype.str, a.shape)).encode())
+    if a.dtype == object:
+        h.update(repr(a.tolist()).encode())
+    else:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return(h.hexdigest())
+#######################################################
+
+
+#######################################################
+def _nbytes(obj):
+    """
+    Estimates the memory used by the arrays in obj
+    """
+    if isinstance(obj, np.ndarray):
+        return(obj.nbytes)
+    if sp.issparse(obj):
+        return(sum(getattr(obj, name).nbytes for name in ('data', 'indices', 'indptr', 'row', 'col') 
+                   if hasattr(obj, name)))
+    if isinstance(obj, plane_sum_entry_forbidden):
+        return(_nbytes(obj.__dict__))
+    if isinstance(obj, slim_line_sum):
+        return(_nbytes((obj.U, obj.V, obj.W)))
+    if isinstance(obj, dict):
+        return(sum(_nbytes(value) for value in obj.values()))
+    if isinstance(obj, (list, tuple)):
+        return(sum(_nbytes(value) for value in obj))
+    return(0)
+#######################################################
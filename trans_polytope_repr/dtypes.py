@@ -0,0 +1,105 @@
+import numpy as np
+
+# Integer types of the arrays of the representations, from the smallest
+# one. The bounds, the margins of the slim line-sum polytope and the 
+# entries of the points are integers, so every such array is stored with
+# the first type of this list that holds all its values. Non-integral 
+# values are kept as float64 and integers that do not fit in int64 as 
+# Python integers (dtype object). The types are signed, so differences 
+# of nonnegative entries, such as x - 1 for a zero entry of a point, 
+# are exact. The margins u, v, w of the plane-sum polytope are only as
+# long as its planes and are kept in int64 (see _exact), and the scalar
+# bounds are used as Python numbers (see _scalar).
+INTEGER_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+#######################################################
+def _integer_dtype(low, high):
+    """
+    Returns the smallest type of INTEGER_DTYPES that holds every integer
+    in [low, high], or object if none does
+    """
+    low, high = int(low), int(high)
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return(np.dtype(dtype))
+    return(np.dtype(object))
+#######################################################
+
+
+#######################################################
+def _value_dtype(*arrays):
+    """
+    Returns the dtype of an array holding the values of arrays (arrays
+    or scalars): the smallest integer type that holds all of them if
+    they are integers, and float64 otherwise
+    """
+    low, high = 0, 0
+    for a in arrays:
+        a = np.asarray(a)
+        if a.size == 0:
+            continue
+        if a.dtype.kind in 'fc' or a.dtype == object:
+            if a.dtype.kind == 'c' or not np.all(np.mod(a, 1) == 0):
+                return(np.dtype(np.float64))
+            if a.dtype.kind == 'f':
+                a = a.astype(object)
+        elif a.dtype.kind not in 'iub':
+            return(np.dtype(np.float64))
+        low, high = min(low, int(a.min())), max(high, int(a.max()))
+    return(_integer_dtype(low, high))
+#######################################################
+
+
+#######################################################
+def _as_value_array(a):
+    """
+    Returns the array a with the type given by _value_dtype, without
+    copying it if it already has it
+    """
+    a = np.asarray(a)
+    dtype = _value_dtype(a)
+    if dtype == object and a.dtype != object:
+        return(np.array([int(x) for x in a.ravel()], dtype=object).reshape(a.shape))
+    return(a.astype(dtype, copy=False))
+#######################################################
+
+
+#######################################################
+def _exact(a, bound=0):
+    """
+    Returns the array a ready for exact arithmetic whose results are at
+    most bound in absolute value: as int64 when the values of a and
+    bound fit in it, as Python integers (dtype object) when they do not,
+    and unchanged when a is not integral. Unsigned types are converted,
+    so that subtractions do not wrap around.
+    """
+    a = np.asarray(a)
+    dtype = _value_dtype(a)
+    if dtype == np.float64:
+        return(a)
+    if dtype == object or _integer_dtype(-abs(int(bound)), abs(int(bound))) == object:
+        return(np.array([int(x) for x in a.ravel()], dtype=object).reshape(a.shape))
+    return(a.astype(np.int64, copy=False))
+#######################################################
+
+
+#######################################################
+def _sum_dtype(X):
+    """
+    Returns the dtype to sum the entries of the array X exactly: int64
+    for integer arrays (so that small types do not overflow) and None
+    (the default of numpy) for the rest
+    """
+    return(np.int64 if np.asarray(X).dtype.kind in 'iub' else None)
+#######################################################
+
+
+#######################################################
+def _scalar(x):
+    """
+    Returns the numpy scalar x as a Python int (or float), so that 
+    arithmetic on it does not overflow
+    """
+    return(x.item() if isinstance(x, np.generic) else x)
+#######################################################
@@ -1,10 +1,16 @@
 import numpy as np
-from .plane_sum import as_plane_sum
-from .slim_line_sum import as_slim_line_sum
-from .preprocessing import prep_rep
+import scipy.sparse as sp
+import time
+import tracemalloc
+from .backends import _resolve_backend, _kernel
+from .dtypes import _value_dtype, _as_value_array, _exact, _scalar
+from .plane_sum import as_plane_sum, _column_margins, _plane_sum_from_entries
+from .slim_line_sum import as_slim_line_sum, _slim_line_sum_size, _slim_line_sum_itemsizes
+from .preprocessing import prep_rep, _binary_expansion_map, _split_entries, _reduced_entries
+from .planning import plan_representation
 
 #######################################################
-def embed_in_plane_sum(M, U, y):
+def embed_in_plane_sum(M, U, y, backend=None):
     """
     Recieves an integer point y inside a polytope P = {y>=0 : Ay=b}
     and returns its embedding in a plane-sum transportation 
@@ -14,58 +20,47 @@ def embed_in_plane_sum(M, U, y):
         - y: Integer point in the polytope P
         - M: Array M = (A|b) that represents the polytope P
         - U: Upper bound for the entries of the polytope P
+    Optional input
+        - backend: 'numpy' or 'numba' (see backends.py). With 'numba' 
+          the point is filled by a compiled loop over the enabled 
+          triplets
     Output    
         -d: a dictionary with the following information
-            x: integer point in plane-sum polytope Q
+            x: integer point in plane-sum polytope Q, with the 
+                smallest integer type that holds its entries
             real_coordinates: image of the injection sigma (we are 
                 getting just ONE copy per coordinate y_k)
             projected_point: image of y under the coordinate-erasing
                 projection
     """    
-    A = M[:, :-1]
-    b = M[:, -1]
-    b_arr = np.array(b).reshape(-1)
-    nrow, ncol = A.shape
-
-    r = []
-    for j in range(ncol):
-        pos_sum = sum([A[i,j] for i in range(nrow) if A[i,j]>0])
-        neg_sum = sum([A[i,j] for i in range(nrow) if A[i,j]<0])
-        r.append(max(pos_sum, abs(neg_sum))) 
-    h = nrow+1
+    backend = _resolve_backend(backend)
+    y = np.asarray(y)
+    r = _column_margins(np.asarray(M)[:, :-1])
+    h = M.shape[0]+1
     
-    P = as_plane_sum(M,U)
+    P = as_plane_sum(M, U, backend=backend)
     E = P.Enabled
-    x = np.zeros((np.sum(r),np.sum(r),h))  
-
-    x_proj = []
-    real_coord = []
-    marker = 0
-    for k in range(ncol):
-        # This part of the code is used when for each point y in P
-        # we consider exactly one real coordinate associated to 
-        # each y_k
-        # real_coord.append(E[marker])
-        # x_proj.append(y[k]) 
-        if r[k] > 1:
-            for i in range(r[k]):
-                a,b,c = E[marker]
-                x[a,b,c] = y[k]
-                real_coord.append(E[marker])
-                x_proj.append(y[k])
-                marker +=1
-            for i in range(r[k]):
-                a,b,c = E[marker]
-                x[a,b,c] = U-y[k]
-                marker +=1
-        else:
-            a,b,c = E[marker]
-            x[a,b,c] = y[k]
-            real_coord.append(E[marker])
-            x_proj.append(y[k])
-            a,b,c = E[marker+1]
-            x[a,b,c] = U-y[k]
-            marker +=2
+
+    # The k-th column of A has s[k] positive triplets, which take the 
+    # value y[k], followed by s[k] negative ones, which take U-y[k]. The
+    # values are computed in int64 so that U-y[k] does not wrap around
+    bound = abs(int(U)) + int(np.max(np.abs(y), initial=0))
+    y_exact, U_exact = _exact(y, bound), _exact(U, bound)
+    x = np.zeros((np.sum(r),np.sum(r),h), dtype=_value_dtype(y_exact, U_exact - y_exact))
+
+    s = np.maximum(r, 1)
+    if backend == 'numba':
+        _kernel('_embed_plane_sum')(E, s, y_exact, U_exact[()], x)
+    else:
+        i, j, k, col, sign, off = _plane_sum_map(r, P)
+        x[i,j,k] = sign*y_exact[col] + _exact(off, bound)
+
+    # This part of the code is used when for each point y in P
+    # we consider exactly one real coordinate associated to 
+    # each y_k
+    positive = np.arange(2*np.sum(s)) - np.repeat(np.cumsum(2*s) - 2*s, 2*s) < np.repeat(s, 2*s)
+    real_coord = E[positive].tolist()
+    x_proj = list(np.repeat(y, s))
 
     d = dict()
     d['point'] = x
@@ -88,66 +83,62 @@ def embed_plane_sum_in_line_sum(P, y, y_real_coordinates=None):
              transportation polytope P
         - P: Plane-sum, entry-forbidden transportation polytope
     Optional input
-        - y_real_coordinates: list of coordinates in y that come
-          from a polytope that was embedded in P   
+        - y_real_coordinates: coordinates in y that come from a 
+          polytope that was embedded in P, given as a list (or (N,3) 
+          array) of coordinates or as a boolean array with the shape 
+          of y
     Output
         -d: a dictionary with the following information
-            x: integer point in slim line-sum polytope T
+            x: integer point in slim line-sum polytope T, with the
+                smallest integer type that holds its entries
             real_coordinates: image of the injection sigma (we are 
                 getting just one copy per coordinate y_k)
             projected_point: image of y under the coordinate-erasing
                 projection
     """
+    y = np.asarray(y)
     l, m, n = y.shape
     
-    U = P.u[0]
-    e = P.get_bounds()
+    U = _scalar(P.u[0])
     
     r = l*m
     c = n+l+m
+
+    # Row I=(i,j) is stored in position i*m+j, and the columns (1,t), 
+    # (2,t), (3,t) in positions t, n+t and n+l+t respectively
+    Y = y.reshape(r, n)
+    rows = np.arange(r)
+    i, j = np.divmod(rows, m)
+
+    # The entries are computed in int64 (Python integers if they could 
+    # overflow it) before choosing the type of x
+    bound = abs(int(U)) + n*int(np.max(np.abs(Y), initial=0))
+    Y_exact, U = _exact(Y, bound), _exact(U, bound)
+    Y_sums = Y_exact.sum(axis=1)
+
+    # Define entries of the form x_{I,(1,t),2}, the entry bound 
+    # e_{i,j,k} is U on the enabled cells and 0 elsewhere
+    bounds_minus_Y = -Y_exact
+    bounds_minus_Y[P.cells[:,0]*m + P.cells[:,1], P.cells[:,2]] += U
     
-    I = [(i,j) for i in range(l) for j in range(m)]
-    J = [(0,t) for t in range(n)]+[(1,t) for t in range(l)]+[(2,t) for t in range(m)]
-    K = [0,1,2]
-    
-    x = np.zeros((r,c,3))
-    real_coord = []
-    x_proj = []
+    x = np.zeros((r,c,3), dtype=_value_dtype(Y_exact, U - Y_sums, Y_sums, bounds_minus_Y))
 
     # Define slice corresponding to y (encoding y)
-    for row_idx, row_label in enumerate(I):
-        i, j = row_label[0], row_label[1]
-        for k in range(n):
-            x[row_idx, k, 0] = y[i,j,k]
-            if(y_real_coordinates is None):
-                real_coord.append([row_idx, k, 0])
-                x_proj.append(y[i,j,k])
-            else:
-                if([i,j,k] in y_real_coordinates):
-                    real_coord.append([row_idx, k, 0])
-                    x_proj.append(y[i,j,k])
+    x[:, :n, 0] = Y
     
     # Define entries of the form x_{I,(2,t),1} and x_{I,(2,t),3}
-    for row_idx, row_label in enumerate(I):
-        i, j = row_label[0], row_label[1]
-        for t in range(l):
-            if t == i:
-                x[row_idx, t+n, 0] = U-np.sum(y[i,j,:])
-                x[row_idx, t+n, 2] = np.sum(y[i,j,:])
+    x[rows, n+i, 0] = U - Y_sums
+    x[rows, n+i, 2] = Y_sums
                 
-    # Define entries of the form x_{I,(1,t),2}         
-    for row_idx, row_label in enumerate(I):
-        i, j = row_label[0], row_label[1]
-        for k in range(n):
-            x[row_idx, k, 1] = e[i,j,k]-y[i,j,k]
+    x[:, :n, 1] = bounds_minus_Y
             
     # Define entries of the form x_{I,(3,t),2} and x_{I,(3,t),3}         
-    for row_idx, row_label in enumerate(I):
-        i, j = row_label[0], row_label[1]
-        for t in range(m):
-            if t == j:
-                x[row_idx, t+n+l, 1] = np.sum(y[i,j,:])
-                x[row_idx, t+n+l, 2] = U-np.sum(y[i,j,:])
+    x[rows, n+l+j, 1] = Y_sums
+    x[rows, n+l+j, 2] = U - Y_sums
+
+    real_rows, real_k = np.nonzero(_coordinates_mask(y_real_coordinates, y.shape).reshape(r, n))
+    real_coord = np.column_stack((real_rows, real_k, np.zeros_like(real_k))).tolist()
+    x_proj = list(Y[real_rows, real_k])
     
     d = dict()
     d['point'] = x
@@ -157,50 +148,216 @@ def embed_plane_sum_in_line_sum(P, y, y_real_coordinates=None):
     return(d)
 #######################################################
 
+
 #######################################################
-def slim_line_sum_representation(P, upper_bound):
+def _coordinates_mask(coordinates, shape):
+    """
+    Returns a boolean array of the given shape that is True on the 
+    given coordinates (all of them if coordinates is None). The 
+    coordinates can also be given as a boolean array. 
+    """
+    if coordinates is None:
+        return(np.ones(shape, dtype=bool))
+
+    coordinates = np.asarray(coordinates)
+    if coordinates.dtype == bool:
+        return(coordinates.reshape(shape))
+
+    coordinates = coordinates.reshape(-1, len(shape)).astype(np.int64)
+    inside = np.all((coordinates >= 0) & (coordinates < np.array(shape)), axis=1)
+    mask = np.zeros(shape, dtype=bool)
+    mask[tuple(coordinates[inside].T)] = True
+    return(mask)
+#######################################################
+
+#######################################################
+def slim_line_sum_representation(P, upper_bound, sparse=False, embedding=False, cache=None, 
+                                 profile=None, backend=None, fused=False):
     """
     Input
         - P: Array encoding a convex polytope P = {x>=0: Ax=b} in standard form
+          (or a scipy.sparse matrix with fused=True)
         - upper_bound: Upper bound on the entries of the integers points inside P 
+    Optional input
+        - sparse: if True, the margins U and W of the output are stored as 
+          scipy.sparse matrices (see as_slim_line_sum)
+        - embedding: if True, the 'TransportationEmbedding' object with 
+          the map between P and the slim line sum polytope is also returned
+        - cache: 'representation_cache' object where the intermediate 
+          results are looked up and stored
+        - profile: function called with a dictionary after every stage,
+          with the name of the stage, its wall time in seconds, the 
+          peak of the memory traced by tracemalloc during the stage 
+          (over the memory at its start) and the dimensions of its 
+          output:
+              prep_rep: rows_added, columns_added
+              plane_sum: sum_r, enabled (length of Enabled)
+              slim_line_sum: r, c
+          Before Stage 3 it is also called with the stage 
+          'slim_line_sum_estimate' and the predicted dimensions and 
+          bytes of the output (see _slim_line_sum_size), so a job can 
+          be rejected by raising an exception before the allocation. 
+          With a cache, the stages are reported as a single stage 
+          'cache' with all the dimensions, and the estimate is given 
+          by plan_representation(P, upper_bound) before the lookup 
+          (with the bytes of W counted as int64)
+        - backend: 'numpy' or 'numba', used by Stages 2 and 3 (see 
+          backends.py), also when they are computed by the cache. The 
+          result does not depend on the backend
+        - fused: if True, the stages are run on the nonzero entries of 
+          the matrices: the entries of the matrix C of prep_rep are 
+          passed to the layout of the plane-sum polytope, whose enabled
+          cells are passed to the builders of U, V and W. Neither (C|d)
+          nor a dense copy of P are built, so P can be a scipy.sparse 
+          matrix and the peak memory is proportional to the output. 
+          The result is the same. It is ignored when a cache is given, 
+          and with profile Stages 1 and 2 are reported as a single 
+          stage 'fused' with the dimensions of both
     Output
         'slim_line_sum' object encoding the slim line sum representation of P
         as described by [De Loera and Onn, 2006]  
     """
-    P_updated = np.array(P)
-    if np.max(P_updated[:, :-1]) > 2:
-        P_updated = prep_rep(P)
-    
-    P_plane_sum = as_plane_sum(P_updated, upper_bound)
-    P_slim_line_sum = as_slim_line_sum(P_plane_sum)
+    backend = _resolve_backend(backend)
+    if profile is not None:
+        return(_profiled_representation(P, upper_bound, sparse, embedding, cache, profile, 
+                                        backend, fused))
+
+    if cache is not None:
+        stages = cache.get(P, upper_bound, sparse=sparse, backend=backend)
+        P_updated, expansion = stages['prep'], stages['expansion']
+        P_plane_sum = stages['plane_sum']
+        P_slim_line_sum = stages['slim_line_sum']
+    elif(fused):
+        P_plane_sum, r, expansion = _plane_sum_stages(P, upper_bound, backend, embedding)
+        P_slim_line_sum = as_slim_line_sum(P_plane_sum, sparse=sparse, backend=backend)
+        if(embedding):
+            return P_slim_line_sum, _transportation_embedding(r, P_plane_sum, expansion)
+        return P_slim_line_sum
+    else:
+        P_updated, expansion = _stage_one(P)
+        P_plane_sum = as_plane_sum(P_updated, upper_bound, backend=backend)
+        P_slim_line_sum = as_slim_line_sum(P_plane_sum, sparse=sparse, backend=backend)
+
+    if(embedding):
+        return P_slim_line_sum, _transportation_embedding(_column_margins(P_updated[:, :-1]), 
+                                                          P_plane_sum, expansion)
 
     return P_slim_line_sum 
 #######################################################
 
 
 #######################################################
-def slim_line_sum_representation(P, upper_bound):
+class TransportationEmbedding:
     """
-    Input
-        - P: Array encoding a convex polytope P = {x>=0: Ax=b} in standard form
-        - upper_bound: Upper bound on the entries of the integers points inside P 
-    Output
-        'slim_line_sum' object encoding the slim line sum representation of P
-        as described by [De Loera and Onn, 2006]  
+    This class has the information of the affine injective map between
+    a polytope P = {y>=0 : Ay=b} and its slim line-sum representation T, 
+    i.e. the map of embed_in_line_sum. 
+
+    Attributes
+        matrix: sparse matrix of shape (r*c*3, n) of the linear part 
+        offset: sparse matrix of shape (1, r*c*3) with the image of y=0
+        shape: shape (r, c, 3) of the points of T
+        real_coordinates: (n,3) array with one coordinate of T for each 
+            coordinate of P, x[real_coordinates[t]] determines y_t
     """
-    P_updated = np.array(P)
-    if np.max(P_updated[:, :-1]) > 2:
-        P_updated = prep_rep(P)
-    
-    P_plane_sum = as_plane_sum(P_updated, upper_bound)
-    P_slim_line_sum = as_slim_line_sum(P_plane_sum)
+    def __init__(self, matrix, offset, shape, real_coordinates, real_sign, real_offset):
+        self.matrix = sp.csr_matrix(matrix)
+        self.offset = sp.csr_matrix(offset)
+        self.shape = tuple(shape)
+        self.real_coordinates = np.asarray(real_coordinates)
+        self._real_index = np.ravel_multi_index(tuple(self.real_coordinates.T), self.shape)
+        self._real_sign = np.asarray(real_sign)
+        self._real_offset = np.asarray(real_offset)
 
-    return P_slim_line_sum 
+    def forward(self, y, sparse=False):
+        """
+        Input
+            - y: point of P, or array of shape (N, n) with N points
+        Optional input
+            - sparse: if True, the output is a scipy.sparse CSR matrix with
+              one flattened point per row
+        Output
+            Image of y in T, with shape (r,c,3) or (N,r,c,3), with the
+            smallest integer type that holds its entries
+        """
+        y = np.asarray(y)
+        X = _apply_map(self.matrix, self.offset, np.atleast_2d(y), sparse)
+        if(sparse):
+            return(X)
+        if y.ndim == 1:
+            return(X.reshape(self.shape))
+        return(X.reshape((len(X),) + self.shape))
+
+    def project(self, x):
+        """
+        Input
+            - x: point of T with shape (r,c,3), array of shape (N,r,c,3) 
+              or sparse matrix of shape (N, r*c*3)
+        Output
+            The point y of P with forward(y) = x, or the (N, n) array 
+            of such points
+        """
+        if sp.issparse(x):
+            X = sp.csr_matrix(x)[:, self._real_index].toarray()
+        else:
+            x = np.asarray(x)
+            X = x.reshape(x.shape[:-3] + (-1,))[..., self._real_index]
+        return(_as_value_array(self._real_sign*_exact(X) + self._real_offset))
+#######################################################
+
+
+#######################################################
+def _apply_map(L, o, Y, sparse=False):
+    """
+    Returns the images Y L^T + o of the rows of Y, with the smallest 
+    integer type that holds them. Integer points are mapped in int64, 
+    so the result is exact. 
+    """
+    Y = _exact(Y)
+    if(sparse):
+        ones = sp.csr_matrix(np.ones((len(Y), 1), dtype=np.int64))
+        X = sp.csr_matrix(sp.csr_matrix(Y) @ L.T + ones @ o)
+        X.eliminate_zeros()
+        return(X.astype(_value_dtype(X.data)))
+
+    return(_as_value_array(np.asarray(L @ Y.T).T + o.toarray()))
+#######################################################
+
+
+#######################################################
+def _transportation_embedding(r, P, expansion=None):
+    """
+    Builds the 'TransportationEmbedding' of the polytope given by M, 
+    where P = as_plane_sum(M, U) and r is the vector of column margins 
+    of M (see as_plane_sum), composed with the map expansion from the 
+    coefficient reduction when it is given. 
+    """
+    matrix, offset, shape = _line_sum_map(r, P)
+    ncol = len(r)
+    m = len(P.v)
+
+    # y_t is read from the entry (I,(1,k),1) of a triplet (i,j,k) of 
+    # y_t, preferring the positive triplets where x = y_t
+    i, j, k, col, sign, off = _plane_sum_map(r, P)
+    order = np.lexsort((-sign, col))
+    first = order[np.searchsorted(col[order], np.arange(ncol))]
+    real_coordinates = np.column_stack((i[first]*m + j[first], k[first], np.zeros(ncol, dtype=np.int64)))
+    real_sign, real_offset = sign[first], -sign[first]*off[first]
+
+    if expansion is not None:
+        # The coordinate y_t of the original polytope is the first 
+        # coordinate of its binary expansion
+        matrix = matrix @ expansion
+        first_col = expansion.tocsc().indices[expansion.tocsc().indptr[:-1]]
+        real_coordinates = real_coordinates[first_col]
+        real_sign, real_offset = real_sign[first_col], real_offset[first_col]
+
+    return(TransportationEmbedding(matrix, offset, shape, real_coordinates, real_sign, real_offset))
 #######################################################
 
 
 #######################################################
-def embed_in_line_sum(y, M, upper_bound):
+def embed_in_line_sum(y, M, upper_bound, fused=False):
     """
     Recieves an integer point y inside a polytope P = {y>=0 : Ay=b}
     and returns its embedding in a slim line sum transportation 
@@ -210,6 +367,12 @@ def embed_in_line_sum(y, M, upper_bound):
         - y: Integer point in the polytope P
         - M: Array M = (A|b) that represents the polytope P
         - upper_bound: Upper bound for the entries of the polytope P
+    Optional input
+        - fused: if True, y is mapped by the sparse map of 
+          embed_in_line_sum_batch, built from the nonzero entries of M
+          as in slim_line_sum_representation, so neither (C|d) nor the
+          point of the plane-sum polytope are built. The result is the 
+          same
     Output
         -d: a dictionary with the following information
             x: integer point in slim line-sum polytope T
@@ -218,6 +381,19 @@ def embed_in_line_sum(y, M, upper_bound):
             projected_point: image of y under the coordinate-erasing
                 projection
     """
+    if(fused):
+        P, r, _ = _plane_sum_stages(M, upper_bound)
+        line_map, offset, shape = _line_sum_map(r, P)
+        x = _apply_map(line_map, offset, np.asarray(y)[None]).reshape(shape)
+
+        # As in embed_plane_sum_in_line_sum, every entry of the point of 
+        # the plane-sum polytope is a real coordinate
+        n = len(P.w)
+        real_rows, real_k = np.divmod(np.arange(shape[0]*n), n)
+        real_coord = np.column_stack((real_rows, real_k, np.zeros_like(real_k))).tolist()
+        return({'point': x, 'real_coordinates': real_coord, 
+                'projected_point': list(x[:, :n, 0].ravel())})
+
     M_updated = np.array(M)
     if np.max(M_updated[:, :-1]) > 2:
         M_updated = prep_rep(M)
@@ -228,4 +404,260 @@ def embed_in_line_sum(y, M, upper_bound):
     line_sum_y = embed_plane_sum_in_line_sum(M_plane_sum, plane_sum_y['point'])
 
     return line_sum_y 
-#######################################################
\ No newline at end of file
+#######################################################
+
+
+#######################################################
+def embed_in_line_sum_batch(Y, M, upper_bound, sparse=False):
+    """
+    Batch version of embed_in_line_sum. The representation of the 
+    polytope is built once and the points are mapped through the 
+    linear map of embed_in_line_sum, stored as a sparse matrix. 
+
+    Input
+        - Y: array of shape (N, ncol) with N integer points in the 
+             polytope P. If the coefficients of M are reduced with 
+             prep_rep, the points can be given either in the 
+             coordinates of P or in the coordinates of the reduced 
+             polytope (as embed_in_line_sum expects)
+        - M: Array (or scipy.sparse matrix) M = (A|b) that represents 
+          the polytope P
+        - upper_bound: Upper bound for the entries of the polytope P
+    Optional input
+        - sparse: if True, the output is a scipy.sparse CSR matrix with 
+          one flattened point per row
+    Output
+        Array of shape (N, r, c, 3) with the points of the slim 
+        line-sum polytope T (or the sparse matrix of shape (N, r*c*3)),
+        with the smallest integer type that holds their entries
+    """
+    P, r, expansion = _plane_sum_stages(M, upper_bound, embedding=True)
+    line_map, offset, shape = _line_sum_map(r, P)
+
+    Y = np.asarray(Y)
+    if expansion is not None and Y.shape[1] == expansion.shape[1]:
+        line_map = line_map @ expansion
+
+    X = _apply_map(line_map, offset, Y, sparse)
+    if(sparse):
+        return(X)
+    return(X.reshape((len(Y),) + shape))
+#######################################################
+
+
+#######################################################
+def _profiled_representation(M, upper_bound, sparse, embedding, cache, profile, backend, 
+                             fused=False):
+    """
+    slim_line_sum_representation with the calls to profile (see the 
+    'profile' argument of that function)
+    """
+    if sp.issparse(M) and (fused and cache is None):
+        shape = M.shape
+    else:
+        M = np.asarray(M)
+        shape = M.shape
+    def run(stage, dimensions, function, *args, **kwargs):
+        result, record = _measure(function, *args, **kwargs)
+        profile(dict(stage=stage, **record, **dimensions(result)))
+        return(result)
+
+    def prep_dimensions(M_updated):
+        return({'rows_added': M_updated.shape[0] - shape[0], 
+                'columns_added': M_updated.shape[1] - shape[1]})
+
+    def plane_sum_dimensions(P):
+        return({'sum_r': len(P.u), 'enabled': len(P.Enabled)})
+
+    def slim_line_sum_dimensions(S):
+        return(dict(zip(('r', 'c'), S.U.shape)))
+
+    if cache is not None:
+        # The cache builds Stage 3 inside cache.get, so the estimate is
+        # predicted from M before the lookup
+        plan = plan_representation(M, upper_bound)
+        profile(dict(stage='slim_line_sum_estimate', sparse=sparse, 
+                     **{key: plan[key] for key in ('r', 'c', 'nnz_U', 'nnz_W', 'dense_bytes', 
+                                                   'sparse_bytes')}))
+        stages = run('cache', 
+                     lambda d: dict(**prep_dimensions(d['prep']), 
+                                    **plane_sum_dimensions(d['plane_sum']), 
+                                    **slim_line_sum_dimensions(d['slim_line_sum'])), 
+                     cache.get, M, upper_bound, sparse=sparse, backend=backend)
+        P_updated, expansion = stages['prep'], stages['expansion']
+        P_plane_sum = stages['plane_sum']
+        P_slim_line_sum = stages['slim_line_sum']
+        r = _column_margins(P_updated[:, :-1])
+    else:
+        if(fused):
+            P_plane_sum, r, expansion = run(
+                'fused', 
+                lambda result: dict(rows_added=len(result[0].w) - 1 - shape[0], 
+                                    columns_added=len(result[1]) - (shape[1] - 1), 
+                                    **plane_sum_dimensions(result[0])), 
+                _plane_sum_stages, M, upper_bound, backend, embedding)
+        else:
+            P_updated, expansion = run('prep_rep', lambda result: prep_dimensions(result[0]), 
+                                       _stage_one, M)
+            P_plane_sum = run('plane_sum', plane_sum_dimensions, as_plane_sum, P_updated, 
+                              upper_bound, backend=backend)
+            r = _column_margins(P_updated[:, :-1])
+
+        estimate = _slim_line_sum_size(len(P_plane_sum.u), len(P_plane_sum.v), 
+                                       len(P_plane_sum.w), len(P_plane_sum.cells), 
+                                       _slim_line_sum_itemsizes(P_plane_sum))
+        profile(dict(stage='slim_line_sum_estimate', sparse=sparse, **estimate))
+
+        P_slim_line_sum = run('slim_line_sum', slim_line_sum_dimensions, as_slim_line_sum, 
+                              P_plane_sum, sparse=sparse, backend=backend)
+
+    if(embedding):
+        return P_slim_line_sum, run('embedding', lambda T: {}, _transportation_embedding, 
+                                    r, P_plane_sum, expansion)
+
+    return P_slim_line_sum
+#######################################################
+
+
+#######################################################
+def _measure(function, *args, **kwargs):
+    """
+    Returns the output of function(*args, **kwargs) and a dictionary 
+    with the wall time of the call and the peak of the memory traced 
+    by tracemalloc during the call, over the memory at its start
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+
+    return(result, {'time': elapsed, 'peak_bytes': max(peak - current, 0)})
+#######################################################
+
+
+#######################################################
+def _stage_one(M):
+    """
+    Returns the array M after the coefficient reduction of 
+    slim_line_sum_representation, and the sparse matrix of the linear 
+    map between both polytopes (None if M is not reduced). 
+    """
+    M_updated = np.array(M)
+    if np.max(M_updated[:, :-1]) > 2:
+        return(prep_rep(M), _binary_expansion_map(M))
+    return(M_updated, None)
+#######################################################
+
+
+#######################################################
+def _plane_sum_stages(M, U, backend='numpy', embedding=False):
+    """
+    Stages 1 and 2 of slim_line_sum_representation on the nonzero 
+    entries of the array (or scipy.sparse matrix) M: the entries of the
+    matrix C of prep_rep are computed from those of A and passed to the
+    layout of as_plane_sum, so neither (C|d) nor a dense copy of M are
+    built. The map of the binary expansion takes a second pass over M, 
+    so it is only built with embedding=True.
+
+    Output
+        - P: as_plane_sum of the output of _stage_one
+        - r: vector r of as_plane_sum (column margins of C)
+        - expansion: as in _stage_one with embedding=True, and None 
+          otherwise
+    """
+    rows, cols, vals, b, shape = _split_entries(M)
+    expansion = None
+    if np.max(vals, initial=0) > 2:
+        rows, cols, vals, b, shape = _reduced_entries(rows, cols, vals, b, *shape)
+        if(embedding):
+            expansion = _binary_expansion_map(M)
+    P, r = _plane_sum_from_entries(rows, cols, vals, b, shape, U, backend)
+    return(P, r, expansion)
+#######################################################
+
+
+#######################################################
+def _plane_sum_map(r, P):
+    """
+    Computes the affine map y -> x of embed_in_plane_sum(M, U, y), where
+    P = as_plane_sum(M, U) and r is the vector r of as_plane_sum (the 
+    column margins of M). The positive triplets of y_k take the value
+    y_k and the negative ones U-y_k. When a cell appears twice in 
+    P.Enabled the last value is the one that is kept. 
+
+    Output
+        - i, j, k: vectors with the cells of x that depend on y
+        - col, sign, off: vectors such that x[i,j,k] = sign*y[col] + off
+    """
+    U = _scalar(P.u[0])
+    m, n = len(P.v), len(P.w)
+
+    s = np.maximum(r, 1)
+    col = np.repeat(np.arange(len(s)), 2*s)
+    t = np.arange(len(col)) - np.repeat(np.cumsum(2*s) - 2*s, 2*s)
+    sign = np.where(t < np.repeat(s, 2*s), 1, -1)
+
+    cells = P.Enabled
+    cell_keys = (cells[:,0]*m + cells[:,1])*n + cells[:,2]
+    _, last = np.unique(cell_keys[::-1], return_index=True)
+    last = np.sort(len(cell_keys) - 1 - last)
+    i, j, k = cells[last].T
+
+    return(i, j, k, col[last], sign[last], np.where(sign[last] > 0, 0, U))
+#######################################################
+
+
+#######################################################
+def _line_sum_map(r, P):
+    """
+    Computes the affine map y -> Ly + o of embed_in_line_sum(y, M, U), 
+    where P = as_plane_sum(M, U) and r is the vector r of as_plane_sum. 
+
+    Output
+        - L: sparse matrix of shape (r*c*3, ncol)
+        - o: sparse matrix of shape (1, r*c*3)
+        - shape (r, c, 3) of the points of the slim line-sum polytope
+    """
+    ncol = len(r)
+    i, j, k, col, sign, off = _plane_sum_map(r, P)
+
+    U = _scalar(P.u[0])
+    l, m, n = len(P.u), len(P.v), len(P.w)
+    r, c = l*m, n+l+m
+
+
+    # Stage 3: every cell (i,j,k) contributes to the entries (I,(1,k),1), 
+    # (I,(1,k),2), (I,(2,i),1), (I,(2,i),3), (I,(3,j),2) and (I,(3,j),3) 
+    # of embed_plane_sum_in_line_sum, where I=(i,j)
+    row = i*m + j
+    flat = lambda a, b, t: (a*c + b)*3 + t
+    entries = np.concatenate((flat(row, k, 0), flat(row, k, 1), flat(row, n+i, 0), 
+                              flat(row, n+i, 2), flat(row, n+l+j, 1), flat(row, n+l+j, 2)))
+    signs = np.array([1, -1, -1, 1, 1, -1])
+
+    L = sp.csr_matrix((np.repeat(signs, len(row))*np.tile(sign, 6), (entries, np.tile(col, 6))), 
+                      shape=(r*c*3, ncol), dtype=np.int64)
+    L.eliminate_zeros()
+
+    # The offset is the image of the point with y=0, where the entries 
+    # (I,(1,k),2) of the enabled cells, (I,(2,i),1) and (I,(3,j),3) are U 
+    rows = np.arange(r)
+    o_entries = np.concatenate((entries, flat(row, k, 1), flat(rows, n + rows//m, 0), 
+                                flat(rows, n+l + rows%m, 2)))
+    o_data = np.concatenate((np.repeat(signs, len(row))*np.tile(off, 6), np.full(len(row), U), 
+                             np.full(2*r, U)))
+    o = sp.csr_matrix((_exact(o_data), (np.zeros(len(o_entries), dtype=np.int64), o_entries)), 
+                      shape=(1, r*c*3))
+    o.eliminate_zeros()
+
+    return(L, o, (r, c, 3))
+#######################################################
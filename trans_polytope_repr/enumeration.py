@@ -0,0 +1,335 @@
+import numpy as np
+import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+#######################################################
+def _iter_lattice_points(low, up, cell_lines, targets, shape, limit=None, 
+                         time_budget=None, callback=None, progress=None, 
+                         workers=None):
+    """
+    Generator over the integer points x with low <= x <= up such that 
+    the sum of the entries of x over every line is equal to its target,
+    in lexicographic order. Used by the classes of the package. 
+
+    Input
+        - low, up: arrays with the bounds of each cell 
+        - cell_lines: array with one row per cell containing the 
+          indices of the lines through it
+        - targets: vector with the sum of the entries of each line
+        - shape: shape of the points
+    Optional input
+        - limit: maximum number of points to generate
+        - time_budget: maximum number of seconds spent in the search
+        - callback: function called with every point before it is 
+          generated
+        - progress: function called with messages about the search
+        - workers: number of processes used in the search
+    Output
+        Generator of arrays with the given shape
+    """
+    problem = _prepare(low, up, cell_lines, targets, progress)
+    deadline = None if time_budget is None else time.time() + time_budget
+
+    counter = 0
+    if problem is not None and (limit is None or limit > 0):
+        if workers is None or workers <= 1:
+            points = _dfs(problem, deadline=deadline)
+        else:
+            points = _parallel_dfs(problem, workers, deadline, 'points', limit, progress)
+
+        for x in points:
+            x = x.reshape(shape)
+            if(callback is not None):
+                callback(x)
+            yield x
+            counter += 1
+            if limit is not None and counter >= limit:
+                break
+
+    _report(progress, counter, deadline)
+#######################################################
+
+
+#######################################################
+def _count_lattice_points(low, up, cell_lines, targets, limit=None, 
+                          time_budget=None, progress=None, workers=None):
+    """
+    Returns the number of points generated by _iter_lattice_points with
+    the same input, without building them.
+    """
+    problem = _prepare(low, up, cell_lines, targets, progress)
+    deadline = None if time_budget is None else time.time() + time_budget
+
+    counter = 0
+    if problem is not None and (limit is None or limit > 0):
+        if workers is None or workers <= 1:
+            for _ in _dfs(problem, deadline=deadline, mode='count'):
+                counter += 1
+                if limit is not None and counter >= limit:
+                    break
+        else:
+            for count in _parallel_dfs(problem, workers, deadline, 'count', limit, progress):
+                counter += count
+                if limit is not None and counter >= limit:
+                    counter = limit
+                    break
+
+    _report(progress, counter, deadline)
+    return(counter)
+#######################################################
+
+
+#######################################################
+def _report(progress, counter, deadline):
+    if(progress is not None):
+        if deadline is not None and time.time() > deadline:
+            progress(f'Time budget exhausted, {counter} integer points found.')
+        else:
+            progress(f'{counter} integer points found.')
+#######################################################
+
+
+#######################################################
+def _prepare(low, up, cell_lines, targets, progress=None):
+    """
+    Returns a dictionary of int64 arrays describing the search, or None
+    if there are no integer points. The cells with a single possible 
+    value are fixed beforehand, and for every line the sums of the 
+    lower and upper bounds of its free cells are precomputed. 
+    """
+    low = np.asarray(low).ravel()
+    up = np.asarray(up).ravel()
+    cell_lines = np.asarray(cell_lines, dtype=np.int64).reshape(len(low), -1)
+    targets = np.asarray(targets).ravel()
+    q = cell_lines.shape[1]
+
+    if(progress is not None):
+        sizes = np.maximum(np.trunc(up) - np.trunc(low) + 1, 0)
+        progress(f'The search space has {np.prod(sizes, dtype=float)} candidates.')
+        progress('Checking integer points ...')
+
+    low = low.astype(np.int64)
+    up = up.astype(np.int64)
+    if np.any(low > up) or np.any(targets != np.round(targets)):
+        return(None)
+
+    need = targets.astype(np.int64)
+    fixed = low == up
+    np.subtract.at(need, cell_lines[fixed].ravel(), np.repeat(low[fixed], q))
+
+    free = np.flatnonzero(~fixed)
+    rem_lo = np.zeros(len(need), dtype=np.int64)
+    rem_hi = np.zeros(len(need), dtype=np.int64)
+    np.add.at(rem_lo, cell_lines[free].ravel(), np.repeat(low[free], q))
+    np.add.at(rem_hi, cell_lines[free].ravel(), np.repeat(up[free], q))
+
+    if np.any(need < rem_lo) or np.any(need > rem_hi):
+        return(None)
+
+    return({'x': low, 'free': free, 'lines': cell_lines[free], 
+            'lo': low[free], 'hi': up[free], 
+            'need': need, 'rem_lo': rem_lo, 'rem_hi': rem_hi})
+#######################################################
+
+
+#######################################################
+def _dfs(problem, prefix=(), stop=None, deadline=None, mode='points'):
+    """
+    Backtracking search over the free cells of a problem returned by 
+    _prepare. The cells are fixed one at a time in order and the values
+    of each cell are tried in increasing order, so the points are 
+    generated in lexicographic order. Before fixing a cell, its range 
+    is reduced using the sums of the lower and upper bounds of the 
+    cells that are still free in each of its lines.
+
+    Optional input
+        - prefix: values of the first free cells, the search only runs 
+          over the points that extend them
+        - stop: if given, the search stops at the first stop free cells
+          and generates tuples with their values
+        - deadline: value of time.time() at which the search stops
+        - mode: 'points' generates the points, 'values' the vectors 
+          with the values of the free cells and 'count' generates None
+    """
+    x = problem['x'].copy()
+    free = problem['free']
+    lines = problem['lines'].tolist()
+    lo, hi = problem['lo'].tolist(), problem['hi'].tolist()
+    need = problem['need'].tolist()
+    rem_lo, rem_hi = problem['rem_lo'].tolist(), problem['rem_hi'].tolist()
+
+    n = len(free) if stop is None else stop
+    val = [0]*len(free)
+    top = [0]*len(free)
+
+    def emit():
+        if stop is not None:
+            return(tuple(val[:stop]))
+        if mode == 'count':
+            return(None)
+        if mode == 'values':
+            return(np.array(val, dtype=np.int64))
+        x[free] = val
+        return(x.copy())
+
+    # The cells in the prefix are fixed as if they were visited before
+    for d, v in enumerate(prefix):
+        L = lines[d]
+        a, b = lo[d], hi[d]
+        for t in L:
+            rem_lo[t] -= lo[d]
+            rem_hi[t] -= hi[d]
+            a = max(a, need[t] - rem_hi[t])
+            b = min(b, need[t] - rem_lo[t])
+        if not a <= v <= b:
+            return
+        val[d] = v
+        for t in L:
+            need[t] -= v
+
+    d0 = len(prefix)
+    if d0 >= n:
+        yield emit()
+        return
+
+    d = d0
+    steps = 0
+    while True:
+        steps += 1
+        if deadline is not None and steps % 1024 == 0 and time.time() > deadline:
+            return
+
+        # Entering the d-th free cell: its range is reduced so that 
+        # every line through it can still reach its target
+        L = lines[d]
+        a, b = lo[d], hi[d]
+        for t in L:
+            rem_lo[t] -= lo[d]
+            rem_hi[t] -= hi[d]
+            a = max(a, need[t] - rem_hi[t])
+            b = min(b, need[t] - rem_lo[t])
+
+        if a <= b:
+            val[d], top[d] = a, b
+            for t in L:
+                need[t] -= a
+            if d < n-1:
+                d += 1
+                continue
+            yield emit()
+        else:
+            for t in L:
+                rem_lo[t] += lo[d]
+                rem_hi[t] += hi[d]
+            d -= 1
+            if d < d0:
+                return
+
+        # Moving to the next value of the deepest cell that has one
+        while True:
+            L = lines[d]
+            if val[d] < top[d]:
+                val[d] += 1
+                for t in L:
+                    need[t] -= 1
+                if d < n-1:
+                    d += 1
+                    break
+                yield emit()
+                continue
+
+            for t in L:
+                need[t] += val[d]
+                rem_lo[t] += lo[d]
+                rem_hi[t] += hi[d]
+            d -= 1
+            if d < d0:
+                return
+#######################################################
+
+
+#######################################################
+def _parallel_dfs(problem, workers, deadline, mode, limit=None, progress=None):
+    """
+    Runs _dfs over a pool of processes. The search tree is split into 
+    the subtrees given by the feasible values of the first free cells,
+    and the subtrees are searched by the workers and merged in 
+    lexicographic order, so the output does not depend on the number 
+    of workers. The arrays of the problem are passed to the workers 
+    once through shared memory. 
+
+    Generates the points (mode 'points') or the number of points of 
+    every subtree (mode 'count'). 
+    """
+    n = len(problem['free'])
+    depth = 0
+    prefixes = [()]
+    while depth < n and len(prefixes) < 8*workers:
+        depth += 1
+        prefixes = list(_dfs(problem, stop=depth))
+
+    if(progress is not None):
+        progress(f'Searching {len(prefixes)} subtrees with {workers} workers ...')
+
+    layout = {}
+    size = 0
+    for key, array in problem.items():
+        layout[key] = (size, array.shape)
+        size += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    executor = None
+    try:
+        for key, (offset, shape) in layout.items():
+            np.ndarray(shape, dtype=np.int64, buffer=shm.buf, offset=offset)[...] = problem[key]
+
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, 
+                                       initargs=(shm.name, layout))
+        results = executor.map(_search_subtree, prefixes, repeat(deadline), 
+                               repeat('values' if mode == 'points' else 'count'), 
+                               repeat(limit))
+        for result in results:
+            if mode == 'count':
+                yield result
+                continue
+            x = problem['x'].copy()
+            for values in result:
+                x[problem['free']] = values
+                yield x.copy()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        shm.close()
+        shm.unlink()
+#######################################################
+
+
+#######################################################
+_worker_shm = None
+_worker_problem = None
+
+def _init_worker(name, layout):
+    global _worker_shm, _worker_problem
+    _worker_shm = shared_memory.SharedMemory(name=name)
+    _worker_problem = {key: np.ndarray(shape, dtype=np.int64, buffer=_worker_shm.buf, offset=offset) 
+                       for key, (offset, shape) in layout.items()}
+
+
+def _search_subtree(prefix, deadline, mode, limit):
+    points = _dfs(_worker_problem, prefix=prefix, deadline=deadline, mode=mode)
+    if mode == 'count':
+        counter = 0
+        for _ in points:
+            counter += 1
+            if limit is not None and counter >= limit:
+                break
+        return(counter)
+
+    values = []
+    for v in points:
+        values.append(v)
+        if limit is not None and len(values) >= limit:
+            break
+    return(np.array(values, dtype=np.int64).reshape(len(values), len(_worker_problem['free'])))
+#######################################################
@@ -0,0 +1,202 @@
+import numpy as np
+import scipy.sparse as sp
+from .slim_line_sum import _dense
+
+#######################################################
+def _write_mps(S, path):
+    """
+    Writes the integer program of the slim line-sum polytope S in free
+    MPS format (see slim_line_sum.to_mps).
+    """
+    r, c = S.U.shape
+    V, W = _dense(S.V), _dense(S.W)
+    Ur, Uc = _nonzero_pattern(S.U)
+
+    with open(path, 'w') as f:
+        f.write('NAME slim_line_sum\n')
+        f.write('ROWS\n')
+        f.write(' N obj\n')
+        for a in range(r):
+            for b in Ur.indices[Ur.indptr[a]:Ur.indptr[a+1]]:
+                f.write(f' E U_{a}_{b}\n')
+        for a in range(r):
+            f.write(''.join(f' E V_{a}_{k}\n' for k in range(3)))
+        for b in range(c):
+            f.write(''.join(f' E W_{b}_{k}\n' for k in range(3)))
+
+        f.write('COLUMNS\n')
+        f.write(" MARKER 'MARKER' 'INTORG'\n")
+        for a, b, k, _ in _variables(Ur, V, W):
+            x = f'x_{a}_{b}_{k}'
+            f.write(f' {x} U_{a}_{b} 1 V_{a}_{k} 1\n {x} W_{b}_{k} 1\n')
+        f.write(" MARKER 'MARKER' 'INTEND'\n")
+
+        f.write('RHS\n')
+        for name, value in _constraint_rhs(Ur, V, W):
+            if value != 0:
+                f.write(f' RHS {name} {_number(value)}\n')
+
+        f.write('BOUNDS\n')
+        for a, b, k, ub in _variables(Ur, V, W):
+            f.write(f' UP BND x_{a}_{b}_{k} {_number(ub)}\n')
+        f.write('ENDATA\n')
+#######################################################
+
+
+#######################################################
+def _write_lp(S, path):
+    """
+    Writes the integer program of the slim line-sum polytope S in CPLEX
+    LP format (see slim_line_sum.to_lp).
+    """
+    r, c = S.U.shape
+    V, W = _dense(S.V), _dense(S.W)
+    Ur, Uc = _nonzero_pattern(S.U)
+
+    # Constraints without variables are written with a zero coefficient
+    # on x_0_0_0, which is then fixed to 0 if it is not a variable
+    dummy = 'x_0_0_0'
+    dummy_used = False
+
+    with open(path, 'w') as f:
+        f.write('\\ slim line-sum transportation polytope\n')
+        f.write('Minimize\n obj:\n')
+        f.write('Subject To\n')
+        for name, terms, value in _constraints(Ur, Uc, V, W):
+            if len(terms) == 0:
+                if value == 0:
+                    continue
+                terms = [f'0 {dummy}']
+                dummy_used = True
+            lines = [' + '.join(terms[start:start+10]) for start in range(0, len(terms), 10)]
+            f.write(f' {name}: ' + '\n + '.join(lines) + f' = {_number(value)}\n')
+
+        f.write('Bounds\n')
+        for a, b, k, ub in _variables(Ur, V, W):
+            f.write(f' x_{a}_{b}_{k} <= {_number(ub)}\n')
+        if dummy_used and (r == 0 or c == 0 or Ur[0, 0] == 0):
+            f.write(f' {dummy} = 0\n')
+
+        f.write('General\n')
+        for a, b, k, _ in _variables(Ur, V, W):
+            f.write(f' x_{a}_{b}_{k}\n')
+        f.write('End\n')
+#######################################################
+
+
+#######################################################
+def _scipy_sparse_program(S):
+    """
+    Returns the program of the slim line-sum polytope S as the input of
+    scipy.optimize.milp or scipy.optimize.linprog (see
+    slim_line_sum.to_scipy_sparse).
+    """
+    r, c = S.U.shape
+    n = r*c*3
+    V, W = _dense(S.V), _dense(S.W)
+    U = sp.coo_matrix(S.U)
+
+    # The variable x[a,b,k] is stored in position (a*c+b)*3+k and lies
+    # in the lines U[a,b], V[a,k] and W[b,k]
+    a, b, k = np.unravel_index(np.arange(n), (r, c, 3))
+    rows = np.concatenate((a*c + b, r*c + a*3 + k, r*c + r*3 + b*3 + k))
+    cols = np.tile(np.arange(n), 3)
+    A_eq = sp.csr_matrix((np.ones(3*n), (rows, cols)), shape=(r*c + r*3 + c*3, n))
+
+    b_eq = np.zeros(r*c + r*3 + c*3)
+    b_eq[U.row*c + U.col] = U.data
+    b_eq[r*c:] = np.concatenate((V.ravel(), W.ravel()))
+
+    up = np.zeros(n)
+    ua, ub = U.row, U.col
+    for t in range(3):
+        up[(ua*c + ub)*3 + t] = np.minimum(np.minimum(U.data, V[ua, t]), W[ub, t])
+    bounds = np.column_stack((np.zeros(n), up))
+
+    return(A_eq, b_eq, bounds)
+#######################################################
+
+
+#######################################################
+def _nonzero_pattern(U):
+    """
+    Returns the matrix U in CSR and CSC formats with sorted indices and
+    without explicit zeros
+    """
+    Ur = sp.csr_matrix(U).sorted_indices()
+    Ur.eliminate_zeros()
+    return(Ur, Ur.tocsc())
+#######################################################
+
+
+#######################################################
+def _variables(Ur, V, W):
+    """
+    Generates the tuples (a, b, k, upper bound) of the variables x[a,b,k]
+    of the program in C order. The variables of the cells (a,b) with
+    U[a,b] = 0 are fixed to 0 and are left out.
+    """
+    for a in range(Ur.shape[0]):
+        start, end = Ur.indptr[a], Ur.indptr[a+1]
+        cols = Ur.indices[start:end]
+        up = np.minimum(np.minimum(Ur.data[start:end, None], V[a][None, :]), W[cols])
+        for b, bounds in zip(cols.tolist(), up.tolist()):
+            for k in range(3):
+                yield(a, b, k, bounds[k])
+#######################################################
+
+
+#######################################################
+def _constraints(Ur, Uc, V, W):
+    """
+    Generates the tuples (name, terms, rhs) of the line-sum constraints,
+    first the lines U[a,b], then V[a,k] and then W[b,k]
+    """
+    r, c = Ur.shape
+    for a in range(r):
+        start, end = Ur.indptr[a], Ur.indptr[a+1]
+        for b, value in zip(Ur.indices[start:end].tolist(), Ur.data[start:end].tolist()):
+            yield(f'U_{a}_{b}', [f'x_{a}_{b}_{k}' for k in range(3)], value)
+    for a in range(r):
+        cols = Ur.indices[Ur.indptr[a]:Ur.indptr[a+1]].tolist()
+        for k in range(3):
+            yield(f'V_{a}_{k}', [f'x_{a}_{b}_{k}' for b in cols], V[a, k])
+    for b in range(c):
+        rows = Uc.indices[Uc.indptr[b]:Uc.indptr[b+1]].tolist()
+        for k in range(3):
+            yield(f'W_{b}_{k}', [f'x_{a}_{b}_{k}' for a in rows], W[b, k])
+#######################################################
+
+
+#######################################################
+def _constraint_rhs(Ur, V, W):
+    """
+    Generates the tuples (name, rhs) of the line-sum constraints in the
+    order of _constraints
+    """
+    r, c = Ur.shape
+    for a in range(r):
+        start, end = Ur.indptr[a], Ur.indptr[a+1]
+        for b, value in zip(Ur.indices[start:end].tolist(), Ur.data[start:end].tolist()):
+            yield(f'U_{a}_{b}', value)
+    for a in range(r):
+        for k in range(3):
+            yield(f'V_{a}_{k}', V[a, k])
+    for b in range(c):
+        for k in range(3):
+            yield(f'W_{b}_{k}', W[b, k])
+#######################################################
+
+
+#######################################################
+def _number(x):
+    """
+    Returns x as written in the files: integers (and integral floats) 
+    with all their digits, so that values above 2**53 are not rounded, 
+    and other floats with 17 significant digits
+    """
+    if isinstance(x, (int, np.integer)) or float(x).is_integer():
+        return(str(int(x)))
+    return(f'{x:.17g}')
+#######################################################
+
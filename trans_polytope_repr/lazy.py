@@ -0,0 +1,214 @@
+import numpy as np
+from collections import OrderedDict
+from .slim_line_sum import as_slim_line_sum, _upper_bound, _slim_line_sum_W_entries
+from .dtypes import _value_dtype, _scalar
+
+#######################################################
+class lazy_slim_line_sum:
+    """
+    View of the slim line-sum polytope as_slim_line_sum(P) that computes
+    the entries and the rows of U, V and W on demand from the plane-sum
+    polytope P, without building the rxc array U. An entry of U or V is
+    found in time O(log N), where N is the number of enabled cells of P,
+    and the last rows that were computed are kept in an LRU cache. The
+    values and types are the same as in as_slim_line_sum(P).
+
+    The rows are labeled by the pairs I=(i,j) and the columns by the
+    pairs J=(kind,t) with kind 0, 1 or 2, as in the proof of Theorem 3.3
+    in [De Loera and Onn, 2006]. row_index, row_label, col_index and
+    col_label convert between labels and positions in time O(1).
+
+    Attributes
+        plane_sum: the plane-sum polytope P
+        shape: shape (r, c) of U
+        max_rows: number of rows kept in the cache
+        hits, misses: number of rows found and not found in the cache
+    """
+    def __init__(self, P, max_rows=1024):
+        l, m, n = len(P.u), len(P.v), len(P.w)
+        if P.bound_sums_ij.shape != (l, m):
+            raise ValueError('The enabled cells of P are outside of the planes of its margins')
+        self.plane_sum = P
+        self.shape = (l*m, n+l+m)
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self._l, self._m, self._n = l, m, n
+
+        # Every nonzero entry of U is e = u[0] in the columns (0,t) and
+        # the upper bound in the columns (1,i) and (2,j)
+        self._e = _scalar(P.u[0])
+        self._U_bound = _upper_bound(P)
+        self._U_dtype = _value_dtype(self._e, self._U_bound)
+        self._V_dtype = _value_dtype(self._U_bound, P.bound_sums_ij.data)
+
+        # P.cells is in lexicographic order, so the cells of row (i,j)
+        # are a contiguous block of the sorted vector of their rows
+        self._cell_rows = P.cells[:, 0]*m + P.cells[:, 1]
+        self._rows = OrderedDict()
+        self._W = None
+
+    @staticmethod
+    def from_matrix(M, U, max_rows=1024):
+        """
+        Returns the view of the slim line-sum representation of the
+        array (or scipy.sparse matrix) M=(A|b) with upper bound U,
+        computing the plane-sum polytope as slim_line_sum_representation
+        with fused=True
+        """
+        from .embedding import _plane_sum_stages
+        return(lazy_slim_line_sum(_plane_sum_stages(M, U)[0], max_rows))
+
+    def row_index(self, i, j):
+        """
+        Returns the position of the row I=(i,j)
+        """
+        if not (0 <= i < self._l and 0 <= j < self._m):
+            raise IndexError(f'Row label {(i, j)} out of range for {self._l}x{self._m} labels')
+        return(i*self._m + j)
+
+    def row_label(self, a):
+        """
+        Returns the label I=(i,j) of the row in position a
+        """
+        _check_index(a, self.shape[0], 'Row')
+        return(divmod(int(a), self._m))
+
+    def col_index(self, kind, t):
+        """
+        Returns the position of the column J=(kind,t), which is t, n+t
+        or n+l+t for kind 0, 1 or 2
+        """
+        if kind not in (0, 1, 2):
+            raise IndexError(f'Column kind {kind} is not 0, 1 or 2')
+        _check_index(t, (self._n, self._l, self._m)[kind], f'Column ({kind},t)')
+        return((0, self._n, self._n + self._l)[kind] + t)
+
+    def col_label(self, b):
+        """
+        Returns the label J=(kind,t) of the column in position b
+        """
+        _check_index(b, self.shape[1], 'Column')
+        b = int(b)
+        if b < self._n:
+            return((0, b))
+        if b < self._n + self._l:
+            return((1, b - self._n))
+        return((2, b - self._n - self._l))
+
+    def U_entry(self, a, b):
+        """
+        Returns U[a,b] without computing the row a
+        """
+        i, j = self.row_label(a)
+        _check_index(b, self.shape[1], 'Column')
+        if b == self._n + i or b == self._n + self._l + j:
+            return(self._U_dtype.type(self._U_bound))
+        if b < self._n and b in self._cell_columns(a):
+            return(self._U_dtype.type(self._e))
+        return(self._U_dtype.type(0))
+
+    def V_entry(self, a, k):
+        """
+        Returns V[a,k]
+        """
+        _check_index(k, 3, 'Column of V')
+        return(self.V_row(a)[k])
+
+    def W_entry(self, b, k):
+        """
+        Returns W[b,k]
+        """
+        _check_index(k, 3, 'Column of W')
+        return(self.W_row(b)[k])
+
+    def U_row(self, a):
+        """
+        Returns the row a of U as a read-only vector of length c
+        """
+        return(self._row(a)[0])
+
+    def V_row(self, a):
+        """
+        Returns the row a of V as a read-only vector of length 3
+        """
+        return(self._row(a)[1])
+
+    def W_row(self, b):
+        """
+        Returns the row b of W as a read-only vector of length 3. W only
+        depends on the margins of P and has c rows, so it is computed
+        the first time it is used, in time O(c).
+        """
+        _check_index(b, self.shape[1], 'Row of W')
+        if self._W is None:
+            W_rows, W_cols, W_data = _slim_line_sum_W_entries(self.plane_sum, self._U_bound)
+            W = np.zeros((self.shape[1], 3), dtype=W_data.dtype)
+            W[W_rows, W_cols] = W_data
+            W.flags.writeable = False
+            self._W = W
+        return(self._W[b])
+
+    def to_slim_line_sum(self, sparse=False, backend=None):
+        """
+        Returns the 'slim_line_sum' object of as_slim_line_sum(P)
+        """
+        return(as_slim_line_sum(self.plane_sum, sparse=sparse, backend=backend))
+
+    def _cell_columns(self, a):
+        """
+        Returns the columns t of the enabled cells (i,j,t) of row a
+        """
+        start = np.searchsorted(self._cell_rows, a, side='left')
+        end = np.searchsorted(self._cell_rows, a, side='right')
+        return(self.plane_sum.cells[start:end, 2])
+
+    def _row(self, a):
+        """
+        Returns the rows a of U and V, from the cache if they are in it
+        """
+        i, j = self.row_label(a)
+        a = i*self._m + j
+        rows = self._rows.get(a)
+        if rows is not None:
+            self._rows.move_to_end(a)
+            self.hits += 1
+            return(rows)
+        self.misses += 1
+
+        U_row = np.zeros(self.shape[1], dtype=self._U_dtype)
+        U_row[self._cell_columns(a)] = self._e
+        U_row[self._n + i] = self._U_bound
+        U_row[self._n + self._l + j] = self._U_bound
+
+        V_row = np.full(3, self._U_bound, dtype=self._V_dtype)
+        V_row[1] = _csr_entry(self.plane_sum.bound_sums_ij, i, j)
+
+        U_row.flags.writeable = False
+        V_row.flags.writeable = False
+        self._rows[a] = (U_row, V_row)
+        if len(self._rows) > self.max_rows:
+            self._rows.popitem(last=False)
+        return((U_row, V_row))
+#######################################################
+
+
+#######################################################
+def _check_index(a, size, name):
+    if not 0 <= a < size:
+        raise IndexError(f'{name} {a} out of range for size {size}')
+#######################################################
+
+
+#######################################################
+def _csr_entry(B, i, j):
+    """
+    Returns the entry B[i,j] of the CSR matrix B with sorted indices,
+    in time O(log) of the length of the row i
+    """
+    start, end = B.indptr[i], B.indptr[i+1]
+    position = start + np.searchsorted(B.indices[start:end], j)
+    if position < end and B.indices[position] == j:
+        return(B.data[position])
+    return(0)
+#######################################################
@@ -1,5 +1,8 @@
 import numpy as np
-from itertools import product
+import scipy.sparse as sp
+from .backends import _resolve_backend, _kernel
+from .dtypes import _value_dtype, _as_value_array, _exact, _sum_dtype, _scalar
+from .enumeration import _iter_lattice_points, _count_lattice_points
 
 #########################################################
 class plane_sum_entry_forbidden:
@@ -11,158 +14,416 @@ class plane_sum_entry_forbidden:
         u: vector of [23] margin sums
         v: vector of [13] margin sums
         w: vector of [12] margin sums
-        Enabled: List of enabled cells 
+        Enabled: (N,3) integer array of enabled cells (one row per 
+            enabled triplet, possibly repeated)
+        cells: enabled cells without repetitions, in lexicographic order
+        bound_sums_ij: sparse (r,r) matrix with the sums of the entry 
+            bounds over each line (i,j,:) 
+        bound_sums_k: vector with the sums of the entry bounds over 
+            each plane (:,:,k)
+        neg_sums: vector with the sums of the absolute values of the 
+            negative entries of each row of the matrix A the polytope 
+            was built from (None if unknown), used by with_rhs
     """
-    def __init__(self, u, v, w, Enabled):
+    def __init__(self, u, v, w, Enabled, neg_sums=None):
         self.u = u
         self.v = v
         self.w = w
-        self.Enabled = Enabled
+        self.Enabled = np.asarray(Enabled, dtype=np.int64).reshape(-1, 3)
+        self.neg_sums = neg_sums
+        
+        # Every enabled cell is bounded by U, so the bounds only need
+        # to be counted over the enabled cells
+        U = _scalar(self.u[0]) if len(self.u) > 0 else 0
+        self.cells = np.unique(self.Enabled, axis=0)
+        i, j, k = self.cells.T
+        # Zero columns of A still get a marker in as_plane_sum, so the
+        # markers can go beyond len(u)
+        shape = (max(len(self.u), np.max(i, initial=-1)+1), 
+                 max(len(self.v), np.max(j, initial=-1)+1))
+        self.bound_sums_ij, self.bound_sums_k = _bound_sums(self.cells, U, shape, len(self.w))
     
     def get_bounds(self):
         """
         Given the 2-margin sums and the enabled cells, it returns a 
         3D array with the bounds on each entry. 
         """
-        U = self.u[0]
+        U = _scalar(self.u[0])
         r = len(self.u)
         h = len(self.w)
-        bounds = np.zeros((r,r,h))
-        for a,b,c in self.Enabled:
-            bounds[a,b,c] = U
+        bounds = np.zeros((r,r,h), dtype=_value_dtype(U))
+        i, j, k = self.cells.T
+        bounds[i,j,k] = U
         return bounds
 
+    def with_rhs(self, b_new, U_new=None):
+        """
+        Returns the plane-sum representation of {x>=0 : Ax=b_new} with 
+        upper bound U_new, where A is the matrix this polytope was built
+        from by as_plane_sum. Only the margins are recomputed, the 
+        enabled cells are shared with this object. 
+
+        Input
+            - b_new: new right hand side
+        Optional input
+            - U_new: new upper bound (by default the current one)
+        """
+        if self.neg_sums is None:
+            raise ValueError('with_rhs needs a polytope built by as_plane_sum')
+        b_new = np.asarray(b_new).reshape(-1)
+        if len(b_new) != len(self.neg_sums):
+            raise ValueError(f'Expected a vector b of length {len(self.neg_sums)}, got {len(b_new)}')
+        if U_new is None:
+            U_new = _scalar(self.u[0]) if len(self.u) > 0 else 0
+
+        u, v, w = _plane_sum_margins(b_new, U_new, len(self.u), self.neg_sums)
+        return(_with_margins(self, u, v, w))
+
+    def save(self, path):
+        """
+        Writes the polytope to the file path in a versioned binary 
+        format with the raw buffers of the arrays, which can be read 
+        back with plane_sum_entry_forbidden.load
+        """
+        from .storage import _save
+        _save(self, path)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Reads a polytope written by save from the file path. 
+
+        Optional input
+            - mmap: if True, the arrays are read-only memory maps of the 
+              file, so loading does not read the arrays and several 
+              processes can share the same file
+        """
+        from .storage import _load
+        return(_load(path, mmap, plane_sum_entry_forbidden))
+
+
+    def get_integer_points(self, progress=None, workers=None):
+        """
+        Returns the list of integer points of the transportation 
+        polytope, in lexicographic order. The points are found by a 
+        backtracking search over the cells that discards partial 
+        assignments that cannot be completed to satisfy the plane sums.
+
+        Optional input
+            - progress: function called with messages about the search
+              (for instance print)
+            - workers: number of processes used in the search
+        """
+        return(list(self.iter_integer_points(progress=progress, workers=workers)))
+
+    def iter_integer_points(self, limit=None, time_budget=None, callback=None, progress=None, 
+                            workers=None):
+        """
+        Generator version of get_integer_points. 
+
+        Optional input
+            - limit: maximum number of points to generate
+            - time_budget: maximum number of seconds spent in the search
+            - callback: function called with every point before it is 
+              generated
+            - progress: function called with messages about the search
+            - workers: number of processes used in the search
+        """
+        return(_iter_lattice_points(*self._lattice_problem(), limit=limit, 
+                                    time_budget=time_budget, callback=callback, 
+                                    progress=progress, workers=workers))
+
+    def count_integer_points(self, limit=None, time_budget=None, progress=None, workers=None):
+        """
+        Returns the number of integer points of the transportation 
+        polytope without storing them. The optional input is as in 
+        iter_integer_points.
+        """
+        low, up, cell_lines, targets, shape = self._lattice_problem()
+        return(_count_lattice_points(low, up, cell_lines, targets, limit=limit, 
+                                     time_budget=time_budget, progress=progress, 
+                                     workers=workers))
 
-    def get_integer_points(self):
+    def _lattice_problem(self):
         r, c, l = len(self.u), len(self.v), len(self.w)
         
         given_bounds = self.get_bounds()
-        bounds = np.zeros((r,c,l))
-        
-        for i in range(r):
-            for j in range(c):
-                for k in range(l):
-                    sum_bound = min(self.u[i], self.v[j], self.w[k])
-                    bounds[i,j,k] = min(sum_bound, given_bounds[i,j,k])
-        
-        ranges = [range(int(j)+1) for j in bounds.ravel()]
-        integer_points = []
+        sum_bounds = np.minimum(np.minimum(np.reshape(self.u, (r,1,1)), 
+                                           np.reshape(self.v, (1,c,1))), 
+                                np.reshape(self.w, (1,1,l)))
+        bounds = np.minimum(sum_bounds, given_bounds)
 
-        for index,vector in enumerate(product(*ranges)):
-            candidate = np.array(vector).reshape(r,c,l)
-            if self.verify_plane_sums(candidate):
-                integer_points.append(candidate)
+        # Every cell lies in the planes u[i], v[j] and w[k]
+        i, j, k = np.indices((r,c,l)).reshape(3, -1)
+        cell_lines = np.column_stack((i, r + j, r + c + k))
+        targets = np.concatenate((self.u, self.v, self.w))
 
-        return(integer_points)
+        return(np.zeros((r,c,l), dtype=np.int64), bounds, cell_lines, targets, (r,c,l))
     
-    def verify_plane_sums(self, x):
+    def verify_plane_sums(self, x, backend=None):
+        """
+        Returns True if the sums of the planes of the array x are given
+        by u, v and w.
+        """
+        return(bool(self.verify_plane_sums_batch(np.asarray(x)[None], backend)[0]))
+
+    def verify_plane_sums_batch(self, X, backend=None):
+        """
+        Input
+            - X: array of shape (N,r,c,l) with N points
+        Optional input
+            - backend: 'numpy' or 'numba' (see backends.py). With 
+              'numba' the sums are computed in one pass over each point
+              without temporary arrays
+        Output
+            Boolean vector with True in the positions of the points 
+            whose plane sums are given by u, v and w
+        """
+        backend = _resolve_backend(backend)
         r, c, l = len(self.u), len(self.v), len(self.w)
+        X = np.asarray(X)
+        if X.shape[1:] != (r,c,l):
+            raise ValueError(f'Expected points of shape {(r,c,l)}, got {X.shape[1:]}')
 
-        flag = True
-        
-        for i in range(r):
-            if(not flag):
-                break
-            if np.sum(x[i,:,:]) != self.u[i]:
-                flag = False
-        
-        for j in range(c):
-            if(not flag):
-                break
-            if np.sum(x[:,j,:]) != self.v[j]:
-                flag = False
-                
-        for k in range(l):
-            if(not flag):
-                break
-            if np.sum(x[:,:,k]) != self.w[k]:
-                flag = False
-                
-        return(flag)
+        if backend == 'numba':
+            # The sums are accumulated in int64 (float64 for non-integer
+            # points) so that the small integer types do not overflow
+            dtype = _sum_dtype(X) or np.float64
+            flags = np.zeros(len(X), dtype=bool)
+            _kernel('_plane_sums_match')(X, np.asarray(self.u), np.asarray(self.v), 
+                                         np.asarray(self.w), np.zeros(r, dtype=dtype), 
+                                         np.zeros(c, dtype=dtype), np.zeros(l, dtype=dtype), 
+                                         flags)
+            return(flags)
+
+        dtype = _sum_dtype(X)
+        flags = np.all(X.sum(axis=(2,3), dtype=dtype) == np.reshape(self.u, (1,r)), axis=1)
+        flags &= np.all(X.sum(axis=(1,3), dtype=dtype) == np.reshape(self.v, (1,c)), axis=1)
+        flags &= np.all(X.sum(axis=(1,2), dtype=dtype) == np.reshape(self.w, (1,l)), axis=1)
+
+        return(flags)
 #######################################################            
         
 
 #######################################################                 
-def as_plane_sum(M, U):
+def as_plane_sum(M, U, backend=None):
     """
     Input:
-        - M: Array M=(A|b) representing a bounded polytope {x>=0 : Ax=b} 
+        - M: Array (or scipy.sparse matrix) M=(A|b) representing a 
+          bounded polytope {x>=0 : Ax=b} 
         - U: Upper bound for the entries of the polytope represented by M
+    Optional input:
+        - backend: 'numpy' or 'numba' (see backends.py). With 'numba' 
+          the rows of A are assigned to the enabled triplets by a 
+          compiled loop over the nonzero entries of A
     Output:
         - Object of the class "plane_sum_entry_forbidden" encoding the
           information of M into a plane-sum entry-forbidden 
           transportation polytope
     """
     
-    A = M[:, :-1]
-    b = M[:, -1]
-    b_arr = np.array(b).reshape(-1)
+    if sp.issparse(M):
+        M = sp.csc_matrix(M)
+        A = M[:, :-1]
+        b = M[:, -1].toarray().ravel()
+    else:
+        A = M[:, :-1]
+        b = M[:, -1]
     nrow, ncol = A.shape
-        
-    r = []
-    for j in range(ncol):
-        pos_sum = sum([A[i,j] for i in range(nrow) if A[i,j]>0])
-        neg_sum = sum([A[i,j] for i in range(nrow) if A[i,j]<0])
-        r.append(max(pos_sum, abs(neg_sum))) 
+
+    rows, cols, vals = _nonzero_entries(A)
+    P, _ = _plane_sum_from_entries(rows, cols, vals, b, (nrow, ncol), U, 
+                                   _resolve_backend(backend))
     
-    h = nrow+1
+    return(P)
+#######################################################
+
+
+#######################################################
+def _plane_sum_from_entries(rows, cols, vals, b, shape, U, backend='numpy'):
+    """
+    as_plane_sum for the polytope {x>=0 : Ax=b} given by the nonzero 
+    entries (rows, cols, vals) of A, the vector b and the shape of A, 
+    so A is never built. Returns the 'plane_sum_entry_forbidden' object
+    and the vector r of as_plane_sum. 
+    """
+    r, neg_sums, Enabled = _plane_sum_layout(rows, cols, vals, *shape, backend)
+    u, v, w = _plane_sum_margins(b, U, sum(r), neg_sums)
     
+    return(plane_sum_entry_forbidden(u, v, w, Enabled, neg_sums), r)
+#######################################################
+
+
+#######################################################
+def _plane_sum_margins(b, U, r_sum, neg_sums):
+    """
+    Returns the margins u, v, w of as_plane_sum, which are the only part
+    of the representation that depends on b and U. 
+
+    Input:
+        - b, U: as in as_plane_sum
+        - r_sum: sum of the vector r of as_plane_sum
+        - neg_sums: vector with the sums of the absolute values of the
+          negative entries of each row of A
+    Output:
+        - u, v, w in int64, or with Python integers if they could 
+          overflow it (see _exact)
+    """
     # I might want to reshape u and v so they have shape 1xr
-    u = np.full(sum(r), U)
-    v = np.full(sum(r), U)
-    
-    w = []
-    for k in range(nrow):
-        w.append(b[k] + U*sum([abs(A[k,j]) for j in range(ncol) if A[k,j]<0])) 
-    w.append(sum(r)*U -sum(w))
-    w = np.array(w)
-
-    # For every k in range(ncol), Y_pos[k] and Y_neg[k] will be the set 
-    # of positive and negative (respectively) enabled triplets 
-    # corresponding to the variable y_{k+1}. 
-    # 'Enabled' is the set list of enabled triplets
+    u = _exact(np.full(r_sum, U))
+    v = u.copy()
     
+    bound = (len(b)+1)*(int(np.max(np.abs(b), initial=0)) + 
+                        abs(int(U))*(int(np.max(neg_sums, initial=0)) + int(r_sum)))
+    b, U, neg_sums = _exact(b, bound), _exact(U, bound), _exact(neg_sums, bound)
+    w = b + U*neg_sums
+    w = _exact(np.append(w, r_sum*U - np.sum(w)))
+
+    return(u, v, w)
+#######################################################
+
+
+#######################################################
+def _with_margins(P, u, v, w):
+    """
+    Returns a copy of the 'plane_sum_entry_forbidden' object P with the
+    margins u, v, w. The enabled cells are shared with P and the bound
+    sums are only rescaled when the entry bound changes. 
+    """
+    Q = object.__new__(plane_sum_entry_forbidden)
+    Q.__dict__.update(P.__dict__)
+    Q.u, Q.v, Q.w = u, v, w
+
+    U_old = _scalar(P.u[0]) if len(P.u) > 0 else 0
+    U_new = _scalar(u[0]) if len(u) > 0 else 0
+    if U_new != U_old:
+        Q.bound_sums_ij, Q.bound_sums_k = _bound_sums(P.cells, U_new, P.bound_sums_ij.shape, 
+                                                      len(w))
+
+    return(Q)
+#######################################################
+
+
+#######################################################
+def _bound_sums(cells, U, shape, h):
+    """
+    Returns the sums of the entry bounds over the lines (i,j,:) as a 
+    sparse matrix of the given shape and over the h planes (:,:,k), when
+    the enabled cells are bounded by U and the rest by 0
+    """
+    i, j, k = cells.T
+    # The numbers of enabled cells of the lines are summed before they 
+    # are multiplied by U, so that the small types do not overflow
+    counts_ij = sp.csr_matrix((np.ones(len(cells), dtype=np.int64), (i, j)), shape=shape)
+    counts_ij.sum_duplicates()
+    counts_k = np.bincount(k, minlength=h)
+    bound = max(int(np.max(counts_ij.data, initial=0)), 
+                int(np.max(counts_k, initial=0)))*abs(int(U))
+    if _value_dtype(bound) == object:
+        raise ValueError(f'The sums of the entry bounds reach {bound} and do not fit in int64')
+    U = _exact(U, bound)
+    bound_sums_ij = sp.csr_matrix((_as_value_array(_exact(counts_ij.data, bound)*U), 
+                                   counts_ij.indices, counts_ij.indptr), shape=shape)
+    bound_sums_k = _exact(counts_k, bound)*U
+    return(bound_sums_ij, bound_sums_k)
+#######################################################
+
+
+#######################################################
+def _nonzero_entries(A):
+    """
+    Returns the nonzero entries (rows, cols, vals) of the array (or
+    scipy.sparse matrix) A sorted by column and then by row. 
+    """
+    if sp.issparse(A):
+        A = sp.csc_matrix(A)
+        A.sort_indices()
+        cols = np.repeat(np.arange(A.shape[1]), np.diff(A.indptr))
+        return(A.indices, cols, A.data)
+    A = np.asarray(A)
+    cols, rows = np.nonzero(A.T)
+    return(rows, cols, A[rows, cols])
+#######################################################
+
+
+#######################################################
+def _plane_sum_layout(rows, cols, vals, nrow, ncol, backend='numpy'):
+    """
+    Computes the part of the plane-sum representation of {x>=0 : Ax=b} 
+    that only depends on the matrix A, given by its nonzero entries.
+
+    Input:
+        - rows, cols, vals: nonzero entries of A 
+        - nrow, ncol: shape of A
+    Output:
+        - r: vector with max(sum of positive, |sum of negative|) 
+          entries of each column of A
+        - neg_sums: vector with the sums of the absolute values of the
+          negative entries of each row of A
+        - Enabled: (N,3) array of enabled triplets. For every column k
+          the positive triplets of y_{k+1} are followed by the negative
+          ones, and the i-th row of A takes the first |A[i,k]| triplets 
+          of the corresponding sign that were not taken by rows before it 
+    """
+    order = np.lexsort((rows, cols))
+    rows = np.asarray(rows, dtype=np.int64)[order]
+    cols = np.asarray(cols, dtype=np.int64)[order]
+    vals = np.asarray(vals)[order].astype(np.int64)
+
+    pos = np.where(vals > 0, vals, 0)
+    neg = np.where(vals < 0, -vals, 0)
+
+    pos_sum = np.zeros(ncol, dtype=np.int64)
+    neg_sum = np.zeros(ncol, dtype=np.int64)
+    neg_sums = np.zeros(nrow, dtype=np.int64)
+    np.add.at(pos_sum, cols, pos)
+    np.add.at(neg_sum, cols, neg)
+    np.add.at(neg_sums, rows, neg)
+    r = np.maximum(pos_sum, neg_sum)
+
+    # Each column k has s[k] = max(r[k], 1) positive and as many negative
+    # triplets, the markers of column k start at start[k]
+    s = np.maximum(r, 1)
+    start = np.cumsum(s) - s
+    col = np.repeat(np.arange(ncol), s)
+    marker = np.arange(np.sum(s))
+    t = marker - start[col]
+
     # We define the 1st 2 entries of the enabled triplets
-    Enabled = []
-    Y_pos = [[] for k in range(ncol)]
-    Y_neg = [[] for k in range(ncol)]
-    marker = 0
-    for k in range(ncol):
-        if r[k] > 1:
-            for i in range(r[k]):
-                Y_pos[k].append([marker, marker, None])
-                if i == 0:
-                    Y_neg[k].append([marker+r[k]-1, marker, None]) 
-                else:
-                    Y_neg[k].append([marker-1, marker, None])
-                marker +=1
-        else:
-            Y_pos[k].append([marker, marker, None])
-            Y_neg[k].append([marker, marker, None])
-            marker +=1
-            
-        Enabled +=(Y_pos[k]+Y_neg[k])
-        
-    # We define the 3rd entry of the enabled triplets
-    for i in range(nrow):
-        for j in range(ncol):
-            if A[i,j]>0:
-                prop_enabled = Y_pos[j]
-            else:
-                prop_enabled = Y_neg[j]
-            n = abs(A[i,j])
-            
-            counter = 0
-            ind_counter = 0
-            while counter < n:
-                if prop_enabled[ind_counter][2] is None:
-                    prop_enabled[ind_counter][2] = i
-                    counter +=1
-                ind_counter +=1
-                
-    for triplet in Enabled:
-        if triplet[2] is None:
-            triplet[2] = nrow
-    
-    return(plane_sum_entry_forbidden(u, v, w, Enabled))
-#######################################################
\ No newline at end of file
+    Enabled = np.empty((2*len(marker), 3), dtype=np.int64)
+    pos_idx = marker + start[col]
+    neg_idx = pos_idx + s[col]
+    Enabled[pos_idx, 0] = marker
+    Enabled[pos_idx, 1] = marker
+    Enabled[neg_idx, 0] = start[col] + (t-1) % s[col]
+    Enabled[neg_idx, 1] = marker
+
+    # We define the 3rd entry of the enabled triplets. The labels of 
+    # the rows are repeated |A[i,k]| times in order and assigned to 
+    # consecutive triplets of column k, the rest get the label nrow
+    if backend == 'numba':
+        _kernel('_enabled_labels')(rows, cols, vals, start, s, nrow, Enabled)
+        return(r, neg_sums, Enabled)
+
+    for idx, weight, col_sum in ((pos_idx, pos, pos_sum), (neg_idx, neg, neg_sum)):
+        label = np.repeat(rows, weight)
+        label_col = np.repeat(cols, weight)
+        label_t = np.arange(len(label)) - (np.cumsum(col_sum) - col_sum)[label_col]
+        third = np.full(len(marker), nrow, dtype=np.int64)
+        third[start[label_col] + label_t] = label
+        Enabled[idx, 2] = third
+
+    return(r, neg_sums, Enabled)
+#######################################################
+
+
+#######################################################
+def _column_margins(A):
+    """
+    Returns the vector r of as_plane_sum, with the maximum of the sum 
+    of the positive entries and the absolute value of the sum of the 
+    negative entries of each column of A. 
+    """
+    A = np.asarray(A).astype(np.int64)
+    return(np.maximum(np.where(A > 0, A, 0).sum(axis=0), np.where(A < 0, -A, 0).sum(axis=0)))
+#######################################################
@@ -0,0 +1,123 @@
+import numpy as np
+import scipy.sparse as sp
+from .plane_sum import _nonzero_entries
+from .slim_line_sum import _slim_line_sum_size
+from .dtypes import _value_dtype, _exact
+
+#######################################################
+def plan_representation(M, U):
+    """
+    Predicts the dimensions and the memory of the representation built
+    by slim_line_sum_representation(M, U) without building it. Only the
+    nonzero entries of A are read, so the time is O(nnz(A)) (times the
+    number of binary digits of the entries when they are reduced).
+
+    Input
+        - M: Array (or scipy.sparse matrix) M=(A|b) representing a
+          polytope {x>=0 : Ax=b}
+        - U: Upper bound for the entries of the polytope
+    Output
+        - d: a dictionary with the following information
+            reduced: True if the coefficients of A are reduced with
+                prep_rep
+            prep_shape: shape of the matrix C of prep_rep (A if it is
+                not reduced)
+            rows_added: number of rows added by prep_rep
+            prep_nnz: number of nonzero entries of C
+            sum_r: sum of the vector r of as_plane_sum, the length of
+                the margins u and v
+            enabled: number of enabled triplets (len(Enabled))
+            cells: number of different enabled cells
+            plane_sum_shape: shape (sum_r, sum_r, n) of the plane-sum
+                polytope
+            r, c: shape of the slim line-sum polytope
+            nnz_U, nnz_W: number of nonzero entries of U and W
+            dense_bytes: bytes of U, V and W with sparse=False
+            sparse_bytes: bytes of U, V and W with sparse=True
+          The bytes are computed with the types of U and V, which only
+          depend on U, and with int64 for W (an upper bound)
+    """
+    if sp.issparse(M):
+        M = sp.csc_matrix(M)
+    else:
+        M = np.asarray(M)
+    nrow, ncol = M.shape[0], M.shape[1]-1
+    rows, cols, vals = _nonzero_entries(M[:, :-1])
+    vals = np.asarray(vals).astype(np.int64)
+
+    # The coefficients are reduced when the largest entry of A is
+    # larger than 2 (see _stage_one)
+    reduced = bool(vals.max(initial=0) > 2)
+
+    if(reduced):
+        C_rows, C_cols, pos_sum, neg_sum, C_nnz = _prep_rep_column_sums(rows, cols, vals,
+                                                                        nrow, ncol)
+    else:
+        C_rows, C_cols, C_nnz = nrow, ncol, len(vals)
+        pos_sum = np.bincount(cols, weights=np.where(vals > 0, vals, 0), minlength=ncol)
+        neg_sum = np.bincount(cols, weights=np.where(vals < 0, -vals, 0), minlength=ncol)
+
+    r = np.maximum(pos_sum, neg_sum).astype(np.int64)
+    sum_r = int(np.sum(r))
+    n = C_rows + 1
+
+    # Every column k of C has max(r[k], 1) positive and as many negative
+    # triplets, which only share a cell when the column is zero
+    enabled = 2*int(np.sum(np.maximum(r, 1)))
+    cells = enabled - int(np.sum(r == 0))
+
+    d = {'reduced': reduced,
+         'prep_shape': (C_rows, C_cols),
+         'rows_added': C_rows - nrow,
+         'prep_nnz': C_nnz,
+         'sum_r': sum_r,
+         'enabled': enabled,
+         'cells': cells,
+         'plane_sum_shape': (sum_r, sum_r, n)}
+    # The entries of U are 0 or U, and those of V are at most 2U since
+    # a line (i,j,:) has at most 2 enabled cells
+    V_bound = 2*_exact(U, 2*abs(int(U)))
+    itemsizes = (_value_dtype(U).itemsize, _value_dtype(U, V_bound).itemsize, 8)
+    d.update(_slim_line_sum_size(sum_r, sum_r, n, cells, itemsizes))
+
+    return(d)
+#######################################################
+
+
+#######################################################
+def _prep_rep_column_sums(rows, cols, vals, nrow, ncol):
+    """
+    Returns the shape of the matrix C of prep_rep, the sums of the
+    positive and of the absolute values of the negative entries of each
+    column of C, and the number of nonzero entries of C, from the
+    nonzero entries of A.
+    """
+    absval = np.abs(vals)
+    col_max = np.zeros(ncol, dtype=np.int64)
+    np.maximum.at(col_max, cols, absval)
+    k = np.array([max(int(x).bit_length() - 1, 0) for x in col_max], dtype=np.int64)
+
+    # The j-th column of A is replaced by the columns col_start[j], ...,
+    # col_start[j]+k[j] of C. The first sum(k) rows of C add a 2 to the
+    # first k[j] of them and a -1 to the last k[j]
+    col_start = np.cumsum(k+1) - (k+1)
+    C_cols = ncol + int(np.sum(k))
+    pos_sum = np.zeros(C_cols, dtype=np.int64)
+    neg_sum = np.zeros(C_cols, dtype=np.int64)
+    t = np.arange(C_cols) - np.repeat(col_start, k+1)
+    last = np.repeat(k, k+1)
+    pos_sum[t < last] += 2
+    neg_sum[t > 0] += 1
+
+    # The last rows of C have the sign of A[i,j] in the columns of the
+    # binary digits of |A[i,j]|
+    bits = 0
+    for s in range(int(col_max.max(initial=0)).bit_length()):
+        digit = ((absval >> s) & 1).astype(bool)
+        C_col = col_start[cols[digit]] + s
+        pos_sum += np.bincount(C_col[vals[digit] > 0], minlength=C_cols)
+        neg_sum += np.bincount(C_col[vals[digit] < 0], minlength=C_cols)
+        bits += int(np.sum(digit))
+
+    return(nrow + int(np.sum(k)), C_cols, pos_sum, neg_sum, 2*int(np.sum(k)) + bits)
+#######################################################
@@ -1,58 +1,173 @@
 import numpy as np
+import scipy.sparse as sp
+from .plane_sum import _nonzero_entries
 
 #################################################
-def prep_rep(M):
+def prep_rep(M, sparse=False):
     """
     This function takes a standard representation of a polytope P and 
     returns the representation of the polytope Q as in step 3.1 of [De Loera and Onn, 2006]
 
     Input:
-         - Array M=(A|b) where P = {y>=0 : Ay=b} 
+         - Array (or scipy.sparse matrix) M=(A|b) where P = {y>=0 : Ay=b} 
+    Optional input:
+         - sparse: if True, (C|d) is returned as a scipy.sparse CSR matrix
     Output:
-        - Array (C|d) where Q = {x>=0 : Cx=d} as in step 3.1 in paper
+        - Array (C|d) where Q = {x>=0 : Cx=d} as in step 3.1 in paper.
+          The entries are int64, or Python integers (object dtype) when 
+          the entries of b do not fit in int64
     """    
-    A = M[:, :-1]
-    b = M[:, -1]
-    
-    nrow, ncol = A.shape
+    rows, cols, vals, d, (nrow_new, ncol_new) = _prep_rep_entries(M)
+    dtype = _rhs_dtype(d)
 
-    k = []
+    if(sparse):
+        if dtype is object:
+            raise OverflowError('The entries of b do not fit in int64, use sparse=False')
+        rows = np.concatenate((rows, np.arange(nrow_new)))
+        cols = np.concatenate((cols, np.full(nrow_new, ncol_new)))
+        vals = np.concatenate((vals, np.asarray(d, dtype=np.int64)))
+        M = sp.csr_matrix((vals, (rows, cols)), shape=(nrow_new, ncol_new+1), dtype=np.int64)
+        M.eliminate_zeros()
+        return(M)
 
-    for j in range(ncol):
-        # The next variable is the j-th column but we replace 0s by 1s 
-        col_ones = np.where(A[:, j] == 0, 1, abs(A[:, j]))
-        bit_col = np.floor(np.log2(col_ones))
-        k.append(int(np.max(bit_col)))
+    M = np.zeros((nrow_new, ncol_new+1), dtype=dtype)
+    M[rows, cols] = vals
+    M[:, -1] = d
+
+    return(M)
+#########################################################
+
+
+#########################################################
+def _prep_rep_entries(M):
+    """
+    Computes the nonzero entries of the matrix C and the vector d of 
+    prep_rep(M) without building C, see _reduced_entries. M can be an
+    array or a scipy.sparse matrix. 
+    """
+    rows, cols, vals, b, (nrow, ncol) = _split_entries(M)
+    return(_reduced_entries(rows, cols, vals, b, nrow, ncol))
+#########################################################
+
+
+#########################################################
+def _split_entries(M):
+    """
+    Returns the nonzero entries (rows, cols, vals) of A, sorted by 
+    column and then by row, the vector b and the shape of A, for the 
+    array (or scipy.sparse matrix) M=(A|b)
+    """
+    if sp.issparse(M):
+        M = sp.csc_matrix(M)
+        b = M[:, -1].toarray().ravel()
+    else:
+        M = np.asarray(M)
+        b = M[:, -1]
+    return(*_nonzero_entries(M[:, :-1]), b, (M.shape[0], M.shape[1]-1))
+#########################################################
+
+
+#########################################################
+def _reduced_entries(rows, cols, vals, b, nrow, ncol):
+    """
+    Computes the nonzero entries of the matrix C and the vector d of 
+    prep_rep(M) from the nonzero entries (rows, cols, vals) of A and 
+    the vector b, in time O(nnz(A)) times the number of binary digits 
+    of the entries of A. 
+
+    Output:
+        - rows, cols, vals: nonzero entries of C
+        - d: vector d
+        - shape of C
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    vals = np.asarray(vals).astype(np.int64)
+    b = np.asarray(b)
+
+    k = _column_bits(cols, vals, ncol)
 
     nrow_new = nrow + np.sum(k)
     ncol_new = ncol + np.sum(k)
-    C = np.zeros((nrow_new, ncol_new))
-
-    # This defines the first sum(k) rows of the matrix C
-    init_col = 0
-    init_row = 0
-    for i in range(len(k)):
-        for j in range(k[i]):
-                C[init_row,init_col] = 2
-                C[init_row,init_col+1] = -1
-                init_row +=1
-                init_col +=1
-        init_col +=1
-        
-    # This defines the last ncol rows of the matrix C    
-    for i in range(nrow):
-        init_col = 0
-        for j in range(ncol):
-            sign = np.sign(A[i,j])
-            for s, t in enumerate(np.binary_repr(abs(A[i,j]))[::-1]):
-                C[init_row, init_col+s] = sign*int(t)
-            
-            init_col +=(k[j]+1)
-        init_row +=1
+
+    # The j-th column of A is replaced by the k[j]+1 columns starting
+    # at col_start[j], and the first sum(k) rows encode 2x_t - x_{t+1} = 0
+    col_start = np.cumsum(k+1) - (k+1)
+    top_row = np.arange(np.sum(k))
+    top_col = np.repeat(col_start - (np.cumsum(k) - k), k) + top_row
+
+    # This defines the last nrow rows of the matrix C, with the sign of
+    # A[i,j] in the columns of the binary digits of |A[i,j]|
+    absval = np.abs(vals)
+    entry, bit = [], []
+    for t in range(int(np.max(k, initial=0)) + 1):
+        digit = np.flatnonzero((absval >> t) & 1)
+        entry.append(digit)
+        bit.append(np.full(len(digit), t))
+    entry, bit = np.concatenate(entry), np.concatenate(bit)
+    bottom_row = rows[entry]
+    bottom_val = np.sign(vals[entry])
+    bottom_col = col_start[cols[entry]] + bit
+
+    rows = np.concatenate((top_row, top_row, np.sum(k) + bottom_row))
+    cols = np.concatenate((top_col, top_col + 1, bottom_col))
+    vals = np.concatenate((np.full(np.sum(k), 2), np.full(np.sum(k), -1), bottom_val))
         
-    d = np.concatenate((np.zeros(sum(k)),b))
-    d = d[..., None]
-    M = np.concatenate((C, d), axis=1)
+    d = np.concatenate((np.zeros(np.sum(k), dtype=b.dtype), b))
+
+    return(rows, cols, vals, d, (nrow_new, ncol_new))
+#########################################################
+
+
+#########################################################
+def _rhs_dtype(b):
+    """
+    Returns int64 if all the entries of b fit in int64 and object otherwise
+    """
+    b = np.asarray(b)
+    if np.issubdtype(b.dtype, np.signedinteger):
+        return(np.int64)
+    bound = max((abs(int(x)) for x in b.ravel()), default=0)
+    if bound <= np.iinfo(np.int64).max:
+        return(np.int64)
+    return(object)
+#########################################################
+
+
+#########################################################
+def _column_bits(cols, vals, ncol):
+    """
+    Returns the vector k where k[j] is the position of the leading 
+    binary digit of the largest absolute value of the entries of the
+    j-th column of A (0 for zero columns), given the nonzero entries 
+    (cols, vals) of A. 
+    """
+    col_max = np.zeros(ncol, dtype=np.int64)
+    np.maximum.at(col_max, cols, np.abs(vals))
+
+    k = np.zeros(ncol, dtype=np.int64)
+    rest = col_max >> 1
+    while rest.any():
+        k += rest > 0
+        rest >>= 1
+
+    return(k)
+#########################################################
+
+
+#########################################################
+def _binary_expansion_map(M):
+    """
+    Returns the sparse matrix L such that y -> Ly maps the points of 
+    P = {y>=0 : Ay=b} to the points of the polytope Q given by 
+    prep_rep(M). The j-th coordinate of y is replaced by the k[j]+1 
+    coordinates y_j, 2y_j, ..., 2^k[j]y_j. 
+    """
+    rows, cols, vals, _, (_, ncol) = _split_entries(M)
+    k = _column_bits(cols, np.asarray(vals).astype(np.int64), ncol)
+
+    cols = np.repeat(np.arange(ncol), k+1)
+    powers = np.arange(len(cols)) - np.repeat(np.cumsum(k+1) - (k+1), k+1)
 
-    return(M.astype('int32'))
-#########################################################
\ No newline at end of file
+    return(sp.csr_matrix((2**powers, (np.arange(len(cols)), cols)), shape=(len(cols), ncol)))
+#########################################################
@@ -1,5 +1,8 @@
 import numpy as np
-from itertools import product
+import scipy.sparse as sp
+from .enumeration import _iter_lattice_points, _count_lattice_points
+from .backends import _resolve_backend, _kernel
+from .dtypes import _value_dtype, _as_value_array, _exact, _sum_dtype, _scalar
 
 #######################################################
 class slim_line_sum:
@@ -11,107 +14,502 @@ class slim_line_sum:
         U: 2-margin fixing entries i,j
         V: 2-margin fixing entries i,k
         W: 2-margin fixing entries j,k
+
+        plane_sum: the plane-sum polytope it was built from by 
+            as_slim_line_sum (None if unknown), used by with_rhs
+
+    U and W can be either dense arrays or scipy.sparse matrices (see
+    as_slim_line_sum), V is always a dense array with 3 columns. 
     """
-    def __init__(self, U, V, W):
+    def __init__(self, U, V, W, plane_sum=None):
         self.U = U
         self.V = V
         self.W = W
+        self.plane_sum = plane_sum
+
+    @property
+    def is_sparse(self):
+        return(sp.issparse(self.U) or sp.issparse(self.W))
+
+    def to_dense(self):
+        """
+        Returns a 'slim_line_sum' object with the margins stored as
+        dense arrays.
+        """
+        return(slim_line_sum(_dense(self.U), _dense(self.V), _dense(self.W), self.plane_sum))
+
+    def with_rhs(self, b_new, U_new=None):
+        """
+        Returns the slim line-sum representation of {x>=0 : Ax=b_new} 
+        with upper bound U_new, where A is the matrix the plane-sum 
+        polytope of this object was built from. U and V are shared with
+        this object when the upper bound does not change, and otherwise
+        only their values are recomputed (the sparse index arrays are 
+        shared). W is always recomputed, in time O(c). 
+
+        Input
+            - b_new: new right hand side
+        Optional input
+            - U_new: new upper bound (by default the current one)
+        """
+        if self.plane_sum is None:
+            raise ValueError('with_rhs needs a polytope built by as_slim_line_sum')
+        P = self.plane_sum.with_rhs(b_new, U_new)
+        
+        r, c = self.U.shape
+        U_bound_old = _upper_bound(self.plane_sum)
+        U_bound = _upper_bound(P)
+        sparse = sp.issparse(self.U)
+
+        if U_bound == U_bound_old:
+            U, V = self.U, self.V
+        elif U_bound_old == 0:
+            # The nonzero pattern of U can not be recovered
+            return(as_slim_line_sum(P, sparse))
+        else:
+            # Every nonzero entry of U is equal to the upper bound, and 
+            # so are the entries of the first and last columns of V
+            dtype = _value_dtype(U_bound)
+            if(sparse):
+                U = sp.csr_matrix((np.full(self.U.nnz, U_bound, dtype=dtype), self.U.indices, 
+                                   self.U.indptr), shape=(r, c))
+            else:
+                U = np.where(self.U != 0, U_bound, 0).astype(dtype)
+            V = _slim_line_sum_V(P, U_bound)
+
+        W_rows, W_cols, W_data = _slim_line_sum_W_entries(P, U_bound)
+        if(sparse):
+            W = sp.csr_matrix((W_data, (W_rows, W_cols)), shape=(c, 3))
+        else:
+            W = np.zeros((c,3), dtype=W_data.dtype)
+            W[W_rows, W_cols] = W_data
+
+        return(slim_line_sum(U, V, W, P))
+
+    def save(self, path):
+        """
+        Writes the polytope (and its plane-sum polytope, if known) to 
+        the file path in a versioned binary format with the raw buffers 
+        of the arrays, which can be read back with slim_line_sum.load
+        """
+        from .storage import _save
+        _save(self, path)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Reads a polytope written by save from the file path. 
+
+        Optional input
+            - mmap: if True, the arrays are read-only memory maps of the 
+              file, so loading does not read the arrays and several 
+              processes can share the same file
+        """
+        from .storage import _load
+        return(_load(path, mmap, slim_line_sum))
+
+    def to_mps(self, path):
+        """
+        Writes the integer program {x integer : 0 <= x, x has line sums
+        U, V, W} to the file path in free MPS format, with a zero
+        objective. The variable x[a,b,k] is named x_a_b_k and the
+        constraints U_a_b, V_a_k and W_b_k. The variables of the cells
+        with U[a,b] = 0 are fixed to 0 and are left out, together with
+        their constraints U_a_b. The file is written line by line
+        without building the constraint matrix.
+        """
+        from .export import _write_mps
+        _write_mps(self, path)
+
+    def to_lp(self, path):
+        """
+        Writes the integer program of to_mps to the file path in CPLEX
+        LP format. Constraints without variables and with a zero right
+        hand side are left out.
+        """
+        from .export import _write_lp
+        _write_lp(self, path)
+
+    def to_scipy_sparse(self):
+        """
+        Returns the program of the polytope as the input of
+        scipy.optimize.milp or scipy.optimize.linprog, with one variable
+        for every cell. The variable x[a,b,k] is stored in position
+        (a*c+b)*3+k and the constraints are the lines U[a,b], V[a,k]
+        and W[b,k], in this order.
 
-    def get_integer_points(self, relaxed_coord=None, all=False, n_relax=-1):
+        Output
+            - A_eq: scipy.sparse CSR matrix of the line-sum constraints
+            - b_eq: vector of line sums
+            - bounds: (r*c*3)x2 array with the bounds of the variables
         """
-        Input:
-            - lower_bounds: array with the lower bounds of the integer
-              points in my transportation polytope 
+        from .export import _scipy_sparse_program
+        return(_scipy_sparse_program(self))
+
+    def get_integer_points(self, relaxed_coord=None, all=False, n_relax=-1, progress=None,
+                           workers=None):
+        """
+        Returns the list of integer points of the transportation 
+        polytope, in lexicographic order. The points are found by a 
+        backtracking search over the cells that discards partial 
+        assignments that cannot be completed to satisfy the line sums.
+
+        Optional input
+            - relaxed_coord: list of coordinates (i,j,k) whose lower 
+              bound is n_relax instead of 0
+            - all: if True, the lower bound of every coordinate is -1
+            - n_relax: lower bound of the coordinates in relaxed_coord
+            - progress: function called with messages about the search
+              (for instance print)
+            - workers: number of processes used in the search. The 
+              search tree is split by the values of the first cells 
+              and the result does not depend on the number of workers
+        """
+        return(list(self.iter_integer_points(relaxed_coord, all, n_relax, progress=progress, 
+                                             workers=workers)))
+
+    def iter_integer_points(self, relaxed_coord=None, all=False, n_relax=-1, limit=None, 
+                            time_budget=None, callback=None, progress=None, workers=None):
+        """
+        Generator version of get_integer_points. 
+
+        Optional input
+            - relaxed_coord, all, n_relax, progress, workers: as in 
+              get_integer_points
+            - limit: maximum number of points to generate
+            - time_budget: maximum number of seconds spent in the search
+            - callback: function called with every point before it is 
+              generated
+        """
+        problem = self._lattice_problem(relaxed_coord, all, n_relax)
+        return(_iter_lattice_points(*problem, limit=limit, time_budget=time_budget, 
+                                    callback=callback, progress=progress, workers=workers))
+
+    def count_integer_points(self, relaxed_coord=None, all=False, n_relax=-1, limit=None, 
+                             time_budget=None, progress=None, workers=None):
         """
+        Returns the number of integer points of the transportation 
+        polytope without storing them. The optional input is as in 
+        iter_integer_points.
+        """
+        low, up, cell_lines, targets, shape = self._lattice_problem(relaxed_coord, all, n_relax)
+        return(_count_lattice_points(low, up, cell_lines, targets, limit=limit, 
+                                     time_budget=time_budget, progress=progress, 
+                                     workers=workers))
+
+    def _lattice_problem(self, relaxed_coord, all, n_relax):
         r, c = self.U.shape
-        l = len(self.W[0])
+        l = self.W.shape[1]
+        U, V, W = _dense(self.U), _dense(self.V), _dense(self.W)
 
         if(all):
-            low_bounds = np.full((r,c,l), -1)
+            low_bounds = np.full((r,c,l), -1, dtype=np.int64)
         else:
-            low_bounds = np.zeros((r,c,l))
+            low_bounds = np.zeros((r,c,l), dtype=np.int64)
 
         if(relaxed_coord is not None):
             for coord in relaxed_coord:
                 i,j,k = coord
                 low_bounds[i,j,k] = n_relax
 
-        up_bounds = np.zeros((r,c,l))
-        for i in range(r):
-            for j in range(c):
-                for k in range(l):
-                    up_bounds[i,j,k] = min(self.U[i,j], self.V[i,k], self.W[j,k])
-
-        ranges = [range(int(a),int(b)+1) for a,b in zip(low_bounds.ravel(), up_bounds.ravel())]
-        # This should be temporary
-        sizes = [b-a+1 for a,b in zip(low_bounds.ravel(), up_bounds.ravel())]
-        # print(sizes)
-
-        integer_points = []
+        up_bounds = np.minimum(np.minimum(U[:,:,None], V[:,None,:]), W[None,:,:])
 
-        # This is temporary to keep track of number of candidates
-        counter = 0
-        print('We are trying to do ', np.prod(sizes), ' iterations.')
-        print('Checking integer points in T ...')
+        # Every cell lies in the lines U[i,j], V[i,k] and W[j,k]
+        i, j, k = np.indices((r,c,l)).reshape(3, -1)
+        cell_lines = np.column_stack((i*c + j, r*c + i*l + k, r*c + r*l + j*l + k))
+        targets = np.concatenate((U.ravel(), V.ravel(), W.ravel()))
 
-        for vector in product(*ranges):
-            counter += 1
-            candidate = np.array(vector).reshape(r,c,l)
-            if self.verify_line_sums(candidate):
-                integer_points.append(candidate)
+        return(low_bounds, up_bounds, cell_lines, targets, (r,c,l))
 
-        print(counter)
-        return(integer_points)
+    def verify_line_sums(self, x, backend=None):
+        """
+        Returns True if the sums of the lines of the rxcxl array x are
+        given by U, V and W.
+        """
+        return(bool(self.verify_line_sums_batch(np.asarray(x)[None], backend)[0]))
 
-    def verify_line_sums(self, x):
+    def verify_line_sums_batch(self, X, backend=None):
+        """
+        Input
+            - X: array of shape (N,r,c,l) with N points
+        Optional input
+            - backend: 'numpy' or 'numba' (see backends.py). With 
+              'numba' the sums are computed in one pass over each point
+              without temporary arrays
+        Output
+            Boolean vector with True in the positions of the points 
+            whose line sums are given by U, V and W
+        """
+        backend = _resolve_backend(backend)
         r, c = self.U.shape
-        l = len(self.W[0])
+        l = self.W.shape[1]
+        X = np.asarray(X)
+        if X.shape[1:] != (r,c,l):
+            raise ValueError(f'Expected points of shape {(r,c,l)}, got {X.shape[1:]}')
 
-        flag = True
+        U, V, W = _dense(self.U), _dense(self.V), _dense(self.W)
+        if backend == 'numba':
+            # The sums are accumulated in int64 (float64 for non-integer
+            # points) so that the small integer types do not overflow
+            dtype = _sum_dtype(X) or np.float64
+            flags = np.zeros(len(X), dtype=bool)
+            _kernel('_line_sums_match')(X, U, V, W, np.zeros(c, dtype=dtype), 
+                                        np.zeros((r,l), dtype=dtype), 
+                                        np.zeros((c,l), dtype=dtype), flags)
+            return(flags)
 
-        for i in range(r):
-            if(not flag):
-                break
-            for j in range(c):
-                if np.sum(x[i,j,:]) != self.U[i,j]:
-                    flag = False
-                    break
+        dtype = _sum_dtype(X)
+        flags = np.all(X.sum(axis=3, dtype=dtype) == U, axis=(1,2))
+        flags &= np.all(X.sum(axis=2, dtype=dtype) == V, axis=(1,2))
+        flags &= np.all(X.sum(axis=1, dtype=dtype) == W, axis=(1,2))
 
-        for i in range(r):
-            if(not flag):
-                break
-            for k in range(l):
-                if np.sum(x[i,:,k]) != self.V[i,k]:
-                    flag = False
-                    break
+        return(flags)
+#######################################################
 
-        for j in range(c):
-            if(not flag):
-                break
-            for k in range(l):
-                if np.sum(x[:,j,k]) != self.W[j,k]:
-                    flag = False
-                    break
 
-        return(flag)
+#######################################################
+def _dense(a):
+    if sp.issparse(a):
+        return(a.toarray())
+    return(np.asarray(a))
 #######################################################
 
 
 #######################################################
-def as_slim_line_sum(P):
+def as_slim_line_sum(P, sparse=False, backend=None):
     """
     Input
         - P: A polytope in the form of plane-sum restricted entries
+    Optional input
+        - sparse: if True, U and W are returned as scipy.sparse CSR 
+          matrices built directly from the enabled cells of P
+        - backend: 'numpy' or 'numba' (see backends.py). With 'numba' 
+          the dense U is filled by a compiled loop over the enabled 
+          cells, without the index arrays of the numpy backend
     Output
         - U: array of line-sums slicing through K-axis 
         - V: array of line-sums slicing through J-axis
         - W: array of line-sums slicing through I-axis
+        Each of them has the smallest integer type that holds its 
+        values (see dtypes.py)
     """
-    
-    a_margin = P.u
-    b_margin = P.v
-    c_margin = P.w
-    E = P.get_bounds()
+    backend = _resolve_backend(backend)
+    l, m, n = len(P.u), len(P.v), len(P.w)
+    r, c = l*m, n+l+m
+    U_bound = _upper_bound(P)
+
+    if(sparse):
+        U = _slim_line_sum_U_csr(P, U_bound)
+    elif backend == 'numba':
+        U = np.zeros((r,c), dtype=_value_dtype(P.u[0], U_bound))
+        _kernel('_slim_dense_U')(P.cells, m, n, l, U.dtype.type(_scalar(P.u[0])), 
+                                 U.dtype.type(U_bound), U)
+    else:
+        U_rows, U_cols, U_data = _slim_line_sum_U_entries(P, U_bound)
+        U = np.zeros((r,c), dtype=U_data.dtype)
+        U[U_rows, U_cols] = U_data
+
+    V = _slim_line_sum_V(P, U_bound)
+    W_rows, W_cols, W_data = _slim_line_sum_W_entries(P, U_bound)
+    if(sparse):
+        W = sp.csr_matrix((W_data, (W_rows, W_cols)), shape=(c, 3))
+    else:
+        W = np.zeros((c,3), dtype=W_data.dtype)
+        W[W_rows, W_cols] = W_data
+
+    return(slim_line_sum(U, V, W, P))
+#######################################################
+
+
+#######################################################
+def _upper_bound(P):
+    """
+    Returns the bound of the entries of the rows of U and of the first 
+    and last columns of V built from the plane-sum polytope P, as a 
+    Python number
+    """
+    return(_scalar(min(max(P.u), max(P.v))))
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_size(l, m, n, n_cells, itemsizes=(8, 8, 8)):
+    """
+    Returns a dictionary with the dimensions (r, c), the number of 
+    nonzero entries of U and W, and the bytes used by U, V and W in 
+    the dense and in the sparse formats of as_slim_line_sum, for a 
+    plane-sum polytope with margins of lengths l, m, n and n_cells 
+    enabled cells. itemsizes has the bytes of an entry of U, V and W 
+    (see _slim_line_sum_itemsizes).
+    """
+    r = l*m
+    c = n+l+m
+    nnz_U = n_cells + 2*r
+    nnz_W = 2*c
+    U_bytes, V_bytes, W_bytes = itemsizes
+
+    # scipy.sparse uses 32 bit indices when they fit
+    index_bytes = 4 if max(nnz_U, r, c) < 2**31 else 8
+    sparse_bytes = ((U_bytes + index_bytes)*nnz_U + (W_bytes + index_bytes)*nnz_W
+                    + index_bytes*(r + c + 2) + V_bytes*3*r)
+
+    return({'r': r, 'c': c, 'nnz_U': nnz_U, 'nnz_W': nnz_W, 
+            'dense_bytes': U_bytes*r*c + V_bytes*3*r + W_bytes*3*c, 
+            'sparse_bytes': sparse_bytes})
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_itemsizes(P):
+    """
+    Returns the bytes of an entry of U, V and W of the slim line-sum 
+    polytope built from P, in time O(c)
+    """
+    U_bound = _upper_bound(P)
+    return((_value_dtype(P.u[0], U_bound).itemsize,
+            _value_dtype(U_bound, P.bound_sums_ij.data).itemsize,
+            _slim_line_sum_W_entries(P, U_bound)[2].dtype.itemsize))
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_U_entries(P, U_bound):
+    """
+    Returns the COO triplets (rows, cols, data) of the rxc array U of 
+    the slim line-sum polytope
+    """
+    l, m, n = len(P.u), len(P.v), len(P.w)
+    r = l*m
+    e = _scalar(P.u[0])
+
+    # Row (i,j) of U is stored in position i*m+j, and the columns 
+    # (0,t), (1,t), (2,t) in positions t, n+t and n+l+t respectively
+    cell_rows = P.cells[:, 0]*m + P.cells[:, 1]
+    cell_t = P.cells[:, 2]
+
+    rows = np.arange(r)
+    i, j = np.divmod(rows, m)
+
+    # Defining the rxc array U
+    U_rows = np.concatenate((cell_rows, rows, rows))
+    U_cols = np.concatenate((cell_t, n+i, n+l+j))
+    dtype = _value_dtype(e, U_bound)
+    U_data = np.concatenate((np.full(len(cell_rows), e, dtype=dtype), 
+                             np.full(2*r, U_bound, dtype=dtype)))
+
+    return((U_rows, U_cols, U_data))
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_U_csr(P, U_bound):
+    """
+    Returns the rxc array U of the slim line-sum polytope as a CSR 
+    matrix, written directly into its final arrays. Row (i,j) holds 
+    the enabled cells (i,j,t) in the order of t followed by the columns
+    n+i and n+l+j, so since P.cells is in lexicographic order the q-th
+    cell goes to position q + 2*(i*m+j) and nothing has to be sorted. 
+    Besides the output, only arrays of the size of P.cells or of the 
+    index arrays are allocated. 
+    """
+    l, m, n = len(P.u), len(P.v), len(P.w)
+    r, c = l*m, n+l+m
+    if P.bound_sums_ij.shape != (l, m):
+        raise ValueError('The enabled cells of P are outside of the planes of its margins')
+    nnz = len(P.cells) + 2*r
+    index = np.int32 if max(nnz, r, c) < 2**31 else np.int64
+
+    cell_rows = P.cells[:, 0]*m + P.cells[:, 1]
+    indptr = np.zeros(r+1, dtype=index)
+    np.cumsum(np.bincount(cell_rows, minlength=r) + 2, out=indptr[1:])
+
+    rows = np.arange(r, dtype=index)
+    indices = np.empty(nnz, dtype=index)
+    indices[indptr[1:] - 2] = n + rows // m
+    indices[indptr[1:] - 1] = n + l + rows % m
+    del rows
+
+    cell_pos = np.arange(len(cell_rows)) + 2*cell_rows
+    indices[cell_pos] = P.cells[:, 2]
+
+    data = np.full(nnz, U_bound, dtype=_value_dtype(P.u[0], U_bound))
+    data[cell_pos] = _scalar(P.u[0])
+
+    return(sp.csr_matrix((data, indices, indptr), shape=(r, c)))
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_V(P, U_bound):
+    """
+    Returns the rx3 array V of the slim line-sum polytope
+    """
+    m = len(P.v)
+    r = len(P.u)*m
+
+    # Defining the rx3 array V
+    V = np.full((r, 3), U_bound, dtype=_value_dtype(U_bound, P.bound_sums_ij.data))
+    V[:, 1] = 0
+    E_ij = P.bound_sums_ij.tocoo()
+    V[E_ij.row*m + E_ij.col, 1] = E_ij.data
+
+    return(V)
+#######################################################
+
+
+#######################################################
+def _slim_line_sum_W_entries(P, U_bound):
+    """
+    Returns the COO triplets (rows, cols, data) of the cx3 array W of 
+    the slim line-sum polytope, which only depends on the margins of P.
+    The entries are computed in int64 (or with Python integers if they
+    could overflow it) and stored with the smallest type that holds them.
+    """
+    a_margin = np.asarray(P.u)
+    b_margin = np.asarray(P.v)
+    c_margin = np.asarray(P.w)
+    E_k = np.asarray(P.bound_sums_k)
+
+    l = len(a_margin)
+    m = len(b_margin)
+    n = len(c_margin)
+
+    bound = max(l, m)*abs(int(U_bound)) + 2*max(int(np.max(np.abs(x), initial=0)) 
+                                                for x in (a_margin, b_margin, c_margin, E_k))
+    a_margin, b_margin = _exact(a_margin, bound), _exact(b_margin, bound)
+    c_margin, E_k, U_bound = _exact(c_margin, bound), _exact(E_k, bound), _exact(U_bound, bound)
+
+    # Defining the cx3 array W
+    t_n, t_l, t_m = np.arange(n), np.arange(l), np.arange(m)
+    W_rows = np.concatenate((t_n, t_n, n+t_l, n+t_l, n+l+t_m, n+l+t_m))
+    W_cols = np.repeat([0, 1, 0, 2, 1, 2], [n, n, l, l, m, m])
+    W_data = _as_value_array(np.concatenate((c_margin, 
+                                             E_k - c_margin, 
+                                             m*U_bound - a_margin, 
+                                             a_margin, 
+                                             a_margin[:m], 
+                                             l*U_bound - b_margin)))
+
+    return((W_rows, W_cols, W_data))
+#######################################################
+
+
+#######################################################
+def _as_slim_line_sum_loops(P):
+    """
+    Reference implementation of as_slim_line_sum that fills U, V and W 
+    entry by entry following the labels I, J and K of the proof of 
+    Theorem 3.3 in [De Loera and Onn, 2006], from the array of entry 
+    bounds of P.get_bounds() instead of the bound sums that 
+    as_slim_line_sum uses. It is much slower than as_slim_line_sum and 
+    only kept to check the equivalence of both. The entries are computed
+    with Python integers, which do not overflow, and U, V and W are 
+    returned with dtype object. 
+    """
+    a_margin = [_scalar(x) for x in P.u]
+    b_margin = [_scalar(x) for x in P.v]
+    c_margin = [_scalar(x) for x in P.w]
+    E = P.get_bounds().astype(object)
     
     l = len(a_margin)
     m = len(b_margin)
@@ -122,9 +520,9 @@ def as_slim_line_sum(P):
         
     U_bound = min(max(a_margin), max(b_margin))
     
-    U = np.zeros((r,c))
-    V = np.zeros((r,3))
-    W = np.zeros((c,3))
+    U = np.zeros((r,c), dtype=object)
+    V = np.zeros((r,3), dtype=object)
+    W = np.zeros((c,3), dtype=object)
     
     I = [(i,j) for i in range(l) for j in range(m)]
     J = [(0,t) for t in range(n)]+[(1,t) for t in range(l)]+[(2,t) for t in range(m)]
@@ -163,7 +561,7 @@ def as_slim_line_sum(P):
         
         if i == 0:
             W[row_idx, 0] = c_margin[j]
-            W[row_idx, 1] = np.sum(E[:,:,j]) - c_margin[j] 
+            W[row_idx, 1] = sum(E[:,:,j].ravel()) - c_margin[j] 
         
         if i == 1:
             W[row_idx, 0] = m*U_bound - a_margin[j]
@@ -174,4 +572,4 @@ def as_slim_line_sum(P):
             W[row_idx, 2] = l*U_bound - b_margin[j]
             
     return(slim_line_sum(U, V, W))
-#######################################################
\ No newline at end of file
+#######################################################
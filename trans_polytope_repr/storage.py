@@ -0,0 +1,135 @@
+import numpy as np
+import scipy.sparse as sp
+import json
+import struct
+from .plane_sum import plane_sum_entry_forbidden
+from .slim_line_sum import slim_line_sum
+
+# A file starts with MAGIC, the format version (uint32) and the length
+# of a JSON header (uint64), followed by the header and by the raw
+# buffers of the arrays, each one aligned to ALIGNMENT bytes
+MAGIC = b'TPREPR\x00\x01'
+VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sIQ')
+_CLASSES = {'plane_sum_entry_forbidden': plane_sum_entry_forbidden,
+            'slim_line_sum': slim_line_sum}
+
+#######################################################
+def _save(obj, path):
+    """
+    Writes the 'plane_sum_entry_forbidden' or 'slim_line_sum' object obj
+    to the file path (see the save methods of both classes).
+    """
+    buffers = []
+    header = {'version': VERSION,
+              'class': type(obj).__name__,
+              'fields': _describe(obj, buffers)}
+    header = json.dumps(header).encode()
+
+    start = _align(_PREFIX.size + len(header))
+    with open(path, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for offset, a in buffers:
+            f.write(b'\x00'*(start + offset - f.tell()))
+            f.write(a.reshape(-1).view(np.uint8).data)
+#######################################################
+
+
+#######################################################
+def _load(path, mmap=True, cls=None):
+    """
+    Reads an object written by _save from the file path. With mmap=True
+    the arrays are read-only np.memmap views of the file, otherwise they
+    are read into memory. If cls is given, the file must hold an object
+    of that class.
+    """
+    with open(path, 'rb') as f:
+        magic, version, length = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a saved representation')
+        if version > VERSION:
+            raise ValueError(f'{path} has format version {version}, the newest supported is {VERSION}')
+        header = json.loads(f.read(length).decode())
+
+    if cls is not None and header['class'] != cls.__name__:
+        raise ValueError(f"{path} holds a '{header['class']}' object, not a '{cls.__name__}' object")
+
+    start = _align(_PREFIX.size + length)
+    def read(field):
+        dtype, shape = np.dtype(field['dtype']), tuple(field['shape'])
+        if np.prod(shape) == 0:
+            return(np.empty(shape, dtype=dtype))
+        if(mmap):
+            return(np.memmap(path, dtype=dtype, mode='r', offset=start + field['offset'],
+                             shape=shape))
+        return(np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                           offset=start + field['offset']).reshape(shape))
+
+    return(_build(header['class'], header['fields'], read))
+#######################################################
+
+
+#######################################################
+def _describe(obj, buffers):
+    """
+    Returns the description of the attributes of obj for the header and
+    appends the arrays to write to the list buffers as (offset, array)
+    """
+    fields = {}
+    for name, value in obj.__dict__.items():
+        if value is None:
+            fields[name] = {'kind': 'none'}
+        elif isinstance(value, tuple(_CLASSES.values())):
+            fields[name] = {'kind': 'object',
+                            'class': type(value).__name__,
+                            'fields': _describe(value, buffers)}
+        elif sp.issparse(value):
+            value = sp.csr_matrix(value)
+            fields[name] = {'kind': 'csr',
+                            'shape': list(value.shape),
+                            'data': _add_buffer(value.data, buffers),
+                            'indices': _add_buffer(value.indices, buffers),
+                            'indptr': _add_buffer(value.indptr, buffers)}
+        else:
+            fields[name] = {'kind': 'array', **_add_buffer(np.asarray(value), buffers)}
+    return(fields)
+#######################################################
+
+
+#######################################################
+def _add_buffer(a, buffers):
+    if a.dtype == object:
+        raise ValueError('Arrays of Python objects can not be saved, the entries must fit in int64')
+    a = np.ascontiguousarray(a)
+    offset = 0
+    if len(buffers) > 0:
+        offset = _align(buffers[-1][0] + buffers[-1][1].nbytes)
+    buffers.append((offset, a))
+    return({'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset})
+#######################################################
+
+
+#######################################################
+def _build(class_name, fields, read):
+    obj = object.__new__(_CLASSES[class_name])
+    for name, field in fields.items():
+        if field['kind'] == 'none':
+            value = None
+        elif field['kind'] == 'object':
+            value = _build(field['class'], field['fields'], read)
+        elif field['kind'] == 'csr':
+            value = sp.csr_matrix((read(field['data']), read(field['indices']),
+                                   read(field['indptr'])), shape=tuple(field['shape']))
+        else:
+            value = read(field)
+        setattr(obj, name, value)
+    return(obj)
+#######################################################
+
+
+#######################################################
+def _align(n):
+    return(-(-n // ALIGNMENT)*ALIGNMENT)
+#######################################################